@@ -0,0 +1,298 @@
+import argparse
+import hashlib
+import multiprocessing as mp
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import server
+
+try:
+    import numpy as np
+except ImportError:  # numpy reikalingas tik "hash" benchmark'ui
+    np = None
+
+# =====================================================
+# Mikro-benchmark'ai server.py daliai
+# -----------------------------------------------------
+# Paleidimas (iš individual/py):
+#   python bench.py recv [--lines 1000000]
+#   python bench.py hash [--tasks 256] [--rounds 10 100 1000]
+#   python bench.py proto [--tasks 1000000]
+#   python bench.py startup [--methods spawn forkserver fork] [--runs 5]
+# =====================================================
+
+# =====================================================
+# Pagalbinis: srautas "idx;payload\n" per socketpair
+# -----------------------------------------------------
+# Siuntėjas (atskira gija) rašo dideliais gabalais,
+# kad matuotume tik gavėjo pusę.
+# =====================================================
+def _feed(sock: socket.socket, n: int) -> None:
+    block = []
+    for i in range(n):
+        block.append(f"{i};{30 + i % 50},{50.0 + i % 40}\n")
+        if len(block) == 4096:
+            sock.sendall("".join(block).encode("utf-8"))
+            block.clear()
+    if block:
+        sock.sendall("".join(block).encode("utf-8"))
+    sock.shutdown(socket.SHUT_WR)
+
+def _measure_recv(n: int, read_one) -> float:
+    a, b = socket.socketpair()
+    t = threading.Thread(target=_feed, args=(a, n), daemon=True)
+    t.start()
+    try:
+        read = read_one(b)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            read()
+        t1 = time.perf_counter()
+    finally:
+        t.join()
+        a.close()
+        b.close()
+    return n / (t1 - t0)
+
+# =====================================================
+# recv: recv_line (po 1 baitą) vs ConnReader.readline
+# -----------------------------------------------------
+# Senas variantas labai lėtas, todėl jis matuojamas
+# su --old-lines eilučių (lines/sec nuo n nepriklauso).
+# =====================================================
+def bench_recv(args) -> None:
+    old = _measure_recv(args.old_lines, lambda s: (lambda: server.recv_line(s)))
+    new = _measure_recv(args.lines, lambda s: server.ConnReader(s).readline)
+    print(f"[BENCH][RECV] recv_line         : {old:12,.0f} lines/s ({args.old_lines} lines)")
+    print(f"[BENCH][RECV] ConnReader.readline: {new:12,.0f} lines/s ({args.lines} lines)")
+    print(f"[BENCH][RECV] speedup x{new / old:.1f}")
+
+# =====================================================
+# Vektorizuotas SHA-256 (tik bench.py hash)
+# -----------------------------------------------------
+# cpu_heavy_py grandinę skaičiuoja daug payload'ų vienu
+# metu: kiekvienas SHA-256 žodis yra uint32 masyvas per
+# visus paketo payload'us (viena "lane" = vienas payload).
+#   - 1-as raundas: hashlib (payload'ų ilgiai skirtingi)
+#   - kiti raundai: įvestis visada 32 B digest'as, t. y.
+#     vienas 64 B blokas su fiksuotu padding'u, todėl
+#     W[8..15] yra konstantos
+# Interpretatoriaus kaina mokama kartą raundui visam
+# paketui, o ne kartą raundui kiekvienam payload'ui.
+# Rezultatas bitas-į-bitą sutampa su cpu_heavy_py.
+# Serveryje nenaudojamas: ~3000 ufunc kvietimų raundui
+# kainuoja daugiau nei hashlib visam PY_BATCH dydžio
+# paketui (lūžio taškas – dešimtys tūkstančių lane'ų).
+# =====================================================
+_SHA_K = (
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+)
+_SHA_IV = (0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19)
+_SHA_PAD = (0x80000000, 0, 0, 0, 0, 0, 0, 256)  # W[8..15] 32 B žinutei
+
+def _rotr(x, k: int):
+    return (x >> k) | (x << (32 - k))
+
+def _sha256_digest_round(words):
+    # words: 8 uint32 masyvų (ankstesnis digest'as) -> naujas digest'as
+    w = list(words) + [np.uint32(c) for c in _SHA_PAD]
+    for t in range(16, 64):
+        w15, w2 = w[t - 15], w[t - 2]
+        s0 = _rotr(w15, 7) ^ _rotr(w15, 18) ^ (w15 >> 3)
+        s1 = _rotr(w2, 17) ^ _rotr(w2, 19) ^ (w2 >> 10)
+        w.append(w[t - 16] + s0 + w[t - 7] + s1)
+
+    lanes = words[0].shape
+    a, b, c, d, e, f, g, h = (np.full(lanes, v, dtype=np.uint32) for v in _SHA_IV)
+    for t in range(64):
+        t1 = h + (_rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)) + ((e & f) ^ (~e & g)) + _SHA_K[t] + w[t]
+        t2 = (_rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)) + ((a & b) ^ (a & c) ^ (b & c))
+        h, g, f, e, d, c, b, a = g, f, e, d + t1, c, b, a, t1 + t2
+    return [iv + x for iv, x in zip(_SHA_IV, (a, b, c, d, e, f, g, h))]
+
+def cpu_heavy_batch(payloads, rounds: int):
+    if rounds < 1 or not payloads:
+        return [server.cpu_heavy_py(payload, rounds) for payload in payloads]
+    digests = b"".join(hashlib.sha256(payload.encode("utf-8")).digest() for payload in payloads)
+    state = np.frombuffer(digests, dtype=">u4").reshape(-1, 8).T.astype(np.uint32)
+    words = list(state)
+    for _ in range(rounds - 1):
+        words = _sha256_digest_round(words)
+    # pirmi 4 digest'o baitai little-endian = word0 su apverstais baitais
+    return words[0].byteswap().tolist()
+
+# =====================================================
+# hash: cpu_heavy_py po vieną vs cpu_heavy_batch (numpy)
+# -----------------------------------------------------
+# Tie patys payload'ai, keli PY_ROUNDS; prieš matavimą
+# patikrinama, kad rezultatai sutampa bitas-į-bitą.
+# =====================================================
+def _payloads(n: int):
+    return [f"{30 + i % 50},{50.0 + i % 40}" for i in range(n)]
+
+def bench_hash(args) -> None:
+    if np is None:
+        raise SystemExit("bench.py hash requires numpy")
+    payloads = _payloads(args.tasks)
+    for rounds in args.rounds:
+        t0 = time.perf_counter()
+        one = [server.cpu_heavy_py(p, rounds) for p in payloads]
+        t1 = time.perf_counter()
+        many = cpu_heavy_batch(payloads, rounds)
+        t2 = time.perf_counter()
+        if one != many:
+            raise SystemExit(f"[BENCH][HASH] mismatch at rounds={rounds}")
+        per_task = args.tasks / (t1 - t0)
+        batched = args.tasks / (t2 - t1)
+        print(f"[BENCH][HASH] rounds={rounds:>6} | per-task {per_task:12,.1f} tasks/s | "
+              f"batched {batched:12,.1f} tasks/s | x{batched / per_task:.2f}")
+
+# =====================================================
+# proto: read_tasks tekstiniu vs binariniu režimu
+# -----------------------------------------------------
+# Matuojam gavėjo pusę (ConnReader + parse) iki
+# (idx, payload) porų; siuntėjas rašo iš anksto
+# paruoštą srautą.
+# =====================================================
+def _send_blob(sock: socket.socket, blob: bytes) -> None:
+    sock.sendall(blob)
+    sock.shutdown(socket.SHUT_WR)
+
+def _measure_tasks(n: int, blob: bytes, binary: bool) -> float:
+    a, b = socket.socketpair()
+    t = threading.Thread(target=_send_blob, args=(a, blob), daemon=True)
+    t.start()
+    try:
+        reader = server.ConnReader(b)
+        t0 = time.perf_counter()
+        for _ in server.read_tasks(reader, n, binary):
+            pass
+        t1 = time.perf_counter()
+    finally:
+        t.join()
+        a.close()
+        b.close()
+    return n / (t1 - t0)
+
+def bench_proto(args) -> None:
+    n = args.tasks
+    text = "".join(f"{i};{30 + i % 50},{50.0 + i % 40:g}\n" for i in range(n)).encode("utf-8")
+    binary = b"".join(server._BIN_TASK.pack(i, 30 + i % 50, 50.0 + i % 40) for i in range(n))
+    txt = _measure_tasks(n, text, False)
+    bin_ = _measure_tasks(n, binary, True)
+    print(f"[BENCH][PROTO] text  : {txt:12,.0f} tasks/s ({len(text) / n:.1f} B/task)")
+    print(f"[BENCH][PROTO] binary: {bin_:12,.0f} tasks/s ({server._BIN_TASK.size} B/task)")
+    print(f"[BENCH][PROTO] speedup x{bin_ / txt:.2f}")
+
+# =====================================================
+# startup: server.py paleidimo laikas pagal PY_START
+# -----------------------------------------------------
+# Kiekvienam paleidimui matuojam nuo Popen iki:
+#   - listen: abu "Listening" pranešimai (RECV ir SEND)
+#   - first:  pirma rezultato eilutė klientui
+#   - exit:   serverio proceso pabaiga
+# Klientas siunčia --tasks užduočių (PY_SESSIONS=1),
+# todėl "first" apima ir worker'ių paleidimą.
+# =====================================================
+def _wait_listening(proc: subprocess.Popen, log: list) -> None:
+    need = {"[PY][RECV] Listening", "[PY][SEND] Listening"}
+    for line in proc.stdout:
+        log.append(line)
+        # RECV ir SEND rašo į tą patį stdout – eilutės gali susipinti
+        need = {m for m in need if m not in line}
+        if not need:
+            return
+    raise SystemExit("[BENCH][STARTUP] server exited before listening:\n" + "".join(log))
+
+def _first_result(n: int) -> None:
+    st = socket.create_connection((server.HOST, server.PORT_IN))
+    sr = socket.create_connection((server.HOST, server.PORT_OUT))
+    try:
+        tasks = "".join(f"{i};{30 + i % 50},{50.0 + i % 40:g}\n" for i in range(n))
+        st.sendall(f"{server.MSG_BEGIN} {n}\n{tasks}{server.MSG_END}\n".encode("utf-8"))
+        reader = server.ConnReader(sr)
+        reader.readline()  # RESULTS n
+        reader.readline()  # pirmas rezultatas
+        while reader.readline().rstrip() != server.MSG_DONE:
+            pass
+    finally:
+        st.close()
+        sr.close()
+
+def _measure_startup(method: str, args) -> tuple:
+    env = dict(os.environ, PY_START=method, PY_SESSIONS="1", PY_STATS_PORT="0",
+               PY_ROUNDS=str(args.rounds), PYTHONUNBUFFERED="1")
+    if args.workers:
+        env["PY_WORKERS"] = str(args.workers)
+    here = os.path.dirname(os.path.abspath(__file__))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(here, "server.py")], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    log = []
+    try:
+        _wait_listening(proc, log)
+        t_listen = time.perf_counter()
+        _first_result(args.tasks)
+        t_first = time.perf_counter()
+        proc.stdout.read()
+        proc.wait(timeout=30)
+        t_exit = time.perf_counter()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    return t_listen - t0, t_first - t0, t_exit - t0
+
+def bench_startup(args) -> None:
+    for method in args.methods:
+        if method not in mp.get_all_start_methods():
+            print(f"[BENCH][STARTUP] {method:<10} not available on this platform")
+            continue
+        runs = [_measure_startup(method, args) for _ in range(args.runs)]
+        listen, first, done = (statistics.median(col) * 1000 for col in zip(*runs))
+        print(f"[BENCH][STARTUP] {method:<10} | listen {listen:8.1f} ms | "
+              f"first result {first:8.1f} ms | exit {done:8.1f} ms (median of {args.runs})")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="server.py micro-benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("recv", help="line reader throughput")
+    p.add_argument("--lines", type=int, default=1_000_000)
+    p.add_argument("--old-lines", type=int, default=100_000)
+    p.set_defaults(func=bench_recv)
+
+    p = sub.add_parser("hash", help="per-task vs batched cpu_heavy_py")
+    p.add_argument("--tasks", type=int, default=256)
+    p.add_argument("--rounds", type=int, nargs="+", default=[10, 100, 1000])
+    p.set_defaults(func=bench_hash)
+
+    p = sub.add_parser("proto", help="text vs binary task parsing")
+    p.add_argument("--tasks", type=int, default=1_000_000)
+    p.set_defaults(func=bench_proto)
+
+    p = sub.add_parser("startup", help="server.py launch latency per start method")
+    p.add_argument("--methods", nargs="+", default=list(server.START_METHODS))
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--tasks", type=int, default=64)
+    p.add_argument("--rounds", type=int, default=10)
+    p.add_argument("--workers", type=int, default=0)
+    p.set_defaults(func=bench_startup)
+
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
+import asyncio
 import hashlib
+import heapq
 import multiprocessing as mp
 import os
+import queue
+import resource
 import socket
+import sqlite3
+import struct
+import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
 
 HOST = "127.0.0.1"
 PORT_IN = 5000   # C++ -> Python (užduotys)
@@ -13,6 +25,50 @@ MSG_BEGIN = "BEGIN"
 MSG_END = "END"
 MSG_RESULTS = "RESULTS"
 MSG_DONE = "DONE"
+MSG_JOB = "JOB"  # "JOB token" eilutė prieš BEGIN / result jungtyje (žr. PY_PAIRING)
+
+# =====================================================
+# Binarinis režimas ("BEGIN n BIN")
+# -----------------------------------------------------
+# Antraštės ir END/DONE lieka tekstinės eilutės, bet
+# užduotys ir rezultatai keliauja fiksuoto pločio
+# little-endian įrašais:
+#   task:   uint32 idx, int32 games, float64 winning (16 B)
+#   result: uint32 idx, uint32 val                    (8 B)
+# Atsakymo antraštė tada "RESULTS n BIN".
+# winning siunčiamas kaip double (tas pats Record::winning),
+# o payload'as atstatomas kaip C++ ostream'e ("%g"), todėl
+# cpu_heavy_py rezultatai tie patys kaip tekstiniame režime
+# (su float32 apvalinimas kartais pakeistų tekstą:
+# 688.9495 -> "688.949" virstų "688.95", t. y. kitas hash'as).
+# =====================================================
+MODE_BIN = "BIN"
+BIN_CHUNK = 4096  # kiek task įrašų skaitom vienu read_exact
+
+_BIN_TASK = struct.Struct("<Iid")
+
+def parse_begin(header: str):
+    # "BEGIN n" arba "BEGIN n BIN" -> (n, binary)
+    parts = header.split()
+    if len(parts) not in (2, 3) or parts[0] != MSG_BEGIN or (len(parts) == 3 and parts[2] != MODE_BIN):
+        raise ValueError(f"Bad header: {header!r} (expected 'BEGIN n' or 'BEGIN n {MODE_BIN}')")
+    return int(parts[1]), len(parts) == 3
+
+def parse_job(line: str):
+    # "JOB token" -> token; bet kuri kita eilutė -> None
+    parts = line.split()
+    if len(parts) == 2 and parts[0] == MSG_JOB:
+        return parts[1]
+    return None
+
+def bin_payload(games: int, winning: float) -> str:
+    return f"{games},{winning:g}"
+
+def encode_results(pairs, binary: bool) -> bytes:
+    if binary:
+        flat = [x for pair in pairs for x in pair]
+        return struct.pack("<%dI" % len(flat), *flat)
+    return "".join(f"{idx};{val}\n" for idx, val in pairs).encode("utf-8")
 
 # =====================================================
 # TCP helperiai (line-based)
@@ -21,6 +77,7 @@ MSG_DONE = "DONE"
 # siunčiam "viena eilutė = vienas pranešimas" su '\n'
 # =====================================================
 def recv_line(conn: socket.socket) -> str:
+    # senas variantas: po 1 baitą (paliktas palyginimui bench.py)
     data = bytearray()
     while True:
         b = conn.recv(1)
@@ -30,10 +87,82 @@ def recv_line(conn: socket.socket) -> str:
         if b == b"\n":
             return data.decode("utf-8")
 
-def send_line(conn: socket.socket, line: str) -> None:
-    if not line.endswith("\n"):
-        line += "\n"
-    conn.sendall(line.encode("utf-8"))
+# =====================================================
+# Buferizuotas skaitytuvas
+# -----------------------------------------------------
+# Vietoj recv(1) kiekvienam baitui skaitom dideliais
+# gabalais (RECV_CHUNK) į vieną buferį ir iš jo pjaustom:
+#   - readline(): viena eilutė iki '\n'
+#   - read_exact(k): k baitų (length-prefixed rėmams)
+# Nepilna eilutė/rėmas lieka buferyje iki kito recv.
+# =====================================================
+RECV_CHUNK = 1 << 16
+
+class ConnReader:
+    def __init__(self, conn: socket.socket, chunk: int = RECV_CHUNK) -> None:
+        self.conn = conn
+        self.chunk = chunk
+        self.buf = bytearray()
+        self.pos = 0  # kiek buferio jau "suvartota"
+
+    def _fill(self) -> None:
+        # suvartotą pradžią išmetam tik kai ji didelė (kad nekopijuotume kas kartą)
+        if self.pos and self.pos >= len(self.buf) // 2:
+            del self.buf[:self.pos]
+            self.pos = 0
+        data = self.conn.recv(self.chunk)
+        if not data:
+            raise ConnectionError("Socket closed")
+        self.buf += data
+
+    def readline_bytes(self) -> memoryview:
+        # grąžina eilutę su '\n' kaip memoryview (be kopijos);
+        # galioja tik iki kito skaitymo iš šio ConnReader
+        while True:
+            nl = self.buf.find(b"\n", self.pos)
+            if nl >= 0:
+                start, self.pos = self.pos, nl + 1
+                return memoryview(self.buf)[start:self.pos]
+            self._fill()
+
+    def readline(self) -> str:
+        return str(self.readline_bytes(), "utf-8")
+
+    def read_exact(self, k: int) -> memoryview:
+        while len(self.buf) - self.pos < k:
+            self._fill()
+        start, self.pos = self.pos, self.pos + k
+        return memoryview(self.buf)[start:self.pos]
+
+# =====================================================
+# Buferizuotas rašytojas
+# -----------------------------------------------------
+# Eilutes kaupia atmintyje ir išsiunčia vienu sendall,
+# kai buferis pilnas arba kai iškviečiamas flush().
+# =====================================================
+SEND_CHUNK = 1 << 16
+
+class ConnWriter:
+    def __init__(self, conn: socket.socket, limit: int = SEND_CHUNK) -> None:
+        self.conn = conn
+        self.limit = limit
+        self.buf = bytearray()
+
+    def write_line(self, line: str) -> None:
+        self.buf += line.encode("utf-8")
+        self.buf += b"\n"
+        if len(self.buf) >= self.limit:
+            self.flush()
+
+    def write_bytes(self, data: bytes) -> None:
+        self.buf += data
+        if len(self.buf) >= self.limit:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buf:
+            self.conn.sendall(self.buf)
+            self.buf.clear()
 
 # =====================================================
 # "Sunki" CPU funkcija
@@ -47,41 +176,810 @@ def cpu_heavy_py(payload: str, rounds: int) -> int:
         h = hashlib.sha256(h).digest()
     return int.from_bytes(h[:4], "little", signed=False)
 
+# =====================================================
+# Paketų (batch) dydis
+# -----------------------------------------------------
+# Užduotys ir rezultatai per eiles keliauja sąrašais,
+# kad pickle/pipe/lock kaina būtų mokama kartą paketui.
+# PY_BATCH – viršutinė riba; mažiems n paketas mažinamas,
+# kad kiekvienas worker'is gautų bent kelis paketus.
+# =====================================================
+def batch_size_for(n: int, worker_count: int, max_batch: int) -> int:
+    return max(1, min(max_batch, n // (worker_count * 4)))
+
+# =====================================================
+# Paketų planuoklė (PY_SCHED)
+# -----------------------------------------------------
+# Receiver prieš kiekvieną paketą klausia next_size(left),
+# kur left – kiek užduočių job'e dar nesupakuota.
+#   - static: visi paketai vienodi (batch_size_for)
+#   - guided: paketas = left / (GUIDED_FACTOR * workers),
+#     t. y. pradžioje dideli paketai (mažai eilės overhead'o),
+#     pabaigoje – vis mažesni, kad paskutiniai paketai
+#     pasiskirstytų per visus worker'ius ir neliktų
+#     vieno ilgo "uodegos" paketo
+# Worker'iai ir toliau ima iš bendros q_in, todėl laisvas
+# worker'is visada pasiima kitą paketą.
+# =====================================================
+GUIDED_FACTOR = 2
+GUIDED_MIN = 1
+
+class StaticChunks:
+    def __init__(self, n: int, worker_count: int, max_batch: int) -> None:
+        self.size = batch_size_for(n, worker_count, max_batch)
+
+    def next_size(self, left: int) -> int:
+        return self.size
+
+class GuidedChunks:
+    def __init__(self, n: int, worker_count: int, max_batch: int) -> None:
+        self.worker_count = worker_count
+        self.max_batch = max_batch
+
+    def next_size(self, left: int) -> int:
+        size = left // (GUIDED_FACTOR * self.worker_count)
+        return max(GUIDED_MIN, min(self.max_batch, size))
+
+SCHEDULERS = {"static": StaticChunks, "guided": GuidedChunks}
+
+# =====================================================
+# Rezultatų cache (PY_CACHE=kelias/iki/failo.sqlite)
+# -----------------------------------------------------
+# cpu_heavy_py(payload, rounds) yra deterministinė, o tie
+# patys "games,winning" kartojasi, todėl rezultatą galima
+# saugoti. Naudojam SQLite failą:
+#   - bendras visiems worker'iams (kiekvienas procesas
+#     atsidaro savo jungtį, WAL režimas)
+#   - išlieka tarp serverio paleidimų
+#   - LRU: `used` atnaujinamas per hit'ą, perpildžius
+#     ištrinami seniausiai naudoti įrašai (PY_CACHE_SIZE)
+#   - hits/misses skaitikliai saugomi tame pačiame faile
+# hit = užduotis, kuriai nereikėjo skaičiuoti hash'o.
+# =====================================================
+SQL_CHUNK = 500  # kiek parametrų viename "IN (...)"
+
+# (pid, path) -> sqlite3.Connection: su PY_START=fork vaikas paveldi tėvo
+# žodyną, bet sqlite jungties per fork dalintis negalima – pid rakte
+# užtikrina, kad kiekvienas procesas atsidarytų savo
+_cache_conns: dict = {}
+
+class ResultCache:
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._conn()
+
+    def _conn(self) -> sqlite3.Connection:
+        key = (os.getpid(), self.path)
+        conn = _cache_conns.get(key)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                         "payload TEXT, rounds INTEGER, val INTEGER, used INTEGER, "
+                         "PRIMARY KEY (payload, rounds)) WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats ("
+                         "id INTEGER PRIMARY KEY CHECK (id = 0), "
+                         "hits INTEGER, misses INTEGER, entries INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO stats VALUES (0, 0, 0, 0)")
+            _cache_conns[key] = conn
+        return conn
+
+    def lookup(self, payloads, rounds: int) -> dict:
+        conn = self._conn()
+        payloads = list(payloads)
+        found = {}
+        for i in range(0, len(payloads), SQL_CHUNK):
+            chunk = payloads[i:i + SQL_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(f"SELECT payload, val FROM cache WHERE rounds = ? AND payload IN ({marks})",
+                                [rounds, *chunk])
+            found.update(rows)
+        if found:
+            now = time.time_ns()
+            conn.executemany("UPDATE cache SET used = ? WHERE payload = ? AND rounds = ?",
+                             [(now, p, rounds) for p in found])
+        return found
+
+    def store(self, values: dict, rounds: int, hits: int, misses: int) -> None:
+        conn = self._conn()
+        now = time.time_ns()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.executemany("INSERT OR IGNORE INTO cache VALUES (?, ?, ?, ?)",
+                                   [(p, rounds, v, now) for p, v in values.items()])
+            conn.execute("UPDATE stats SET hits = hits + ?, misses = misses + ?, entries = entries + ?",
+                         (hits, misses, max(0, cur.rowcount)))
+            (entries,) = conn.execute("SELECT entries FROM stats").fetchone()
+            if entries > self.max_entries:
+                conn.execute("DELETE FROM cache WHERE (payload, rounds) IN "
+                             "(SELECT payload, rounds FROM cache ORDER BY used LIMIT ?)",
+                             (entries - self.max_entries,))
+                conn.execute("UPDATE stats SET entries = ?", (self.max_entries,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        # (hits, misses, entries) – sukaupti per visus paleidimus
+        return self._conn().execute("SELECT hits, misses, entries FROM stats").fetchone()
+
+# =====================================================
+# Vieno paketo skaičiavimas (su cache arba be)
+# -----------------------------------------------------
+# Naudoja ir worker_loop, ir asyncio pool'as.
+# Su cache: pirma lookup visiems paketo payload'ams,
+# skaičiuojami tik nerasti (kiekvienas unikalus – kartą).
+# =====================================================
+def compute_batch(batch, rounds: int, cache: ResultCache = None):
+    if cache is None:
+        return [(idx, cpu_heavy_py(payload, rounds)) for idx, payload in batch]
+
+    known = cache.lookup({payload for _, payload in batch}, rounds)
+    todo = list(dict.fromkeys(payload for _, payload in batch if payload not in known))
+    fresh = {payload: cpu_heavy_py(payload, rounds) for payload in todo}
+    cache.store(fresh, rounds, len(batch) - len(fresh), len(fresh))
+    known.update(fresh)
+    return [(idx, known[payload]) for idx, payload in batch]
+
+# =====================================================
+# Shared-memory transportas (PY_TRANSPORT=shm)
+# -----------------------------------------------------
+# Fiksuoto dydžio slotų žiedas bendroje atmintyje:
+#   - free semaforas: kiek laisvų slotų
+#   - full semaforas: kiek užpildytų slotų
+#   - head/tail: rašymo/skaitymo pozicijos (su savo lock'u)
+# Rašoma/skaitoma laikant head/tail lock'ą, todėl slotas
+# niekada neperskaitomas, kol jo rašymas nebaigtas.
+# Vienas slotas = vienas paketas, be pickle.
+# =====================================================
+RING_SLOTS = 64
+PAYLOAD_MAX = 48          # payload "games,winning" baitais
+STOP_COUNT = 0xFFFFFFFF   # paketo ilgis, reiškiantis None (stop)
+
+_HDR = struct.Struct("<IIQ")     # įrašų skaičius slote, job id, įdėjimo laikas (ns)
+_RES_HDR = struct.Struct("<III") # rezultatų sk., job id, dublikatų nuorodų sk.
+_TASK = struct.Struct("<IH%ds" % PAYLOAD_MAX)  # idx, len, payload
+_RES = struct.Struct("<II")      # idx, val
+
+class ShmRing:
+    def __init__(self, slots: int, slot_size: int) -> None:
+        self.slots = slots
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self.free = mp.Semaphore(slots)
+        self.full = mp.Semaphore(0)
+        self.head = mp.Value("Q", 0)
+        self.tail = mp.Value("Q", 0)
+
+    def _put(self, write) -> None:
+        self.free.acquire()
+        with self.head.get_lock():
+            off = (self.head.value % self.slots) * self.slot_size
+            write(self.shm.buf, off)
+            self.head.value += 1
+        self.full.release()
+
+    def _get(self, read, timeout=None):
+        # kaip mp.Queue.get: pasibaigus timeout -> queue.Empty
+        if not self.full.acquire(timeout=timeout):
+            raise queue.Empty
+        with self.tail.get_lock():
+            off = (self.tail.value % self.slots) * self.slot_size
+            item = read(self.shm.buf, off)
+            self.tail.value += 1
+        self.free.release()
+        return item
+
+    def close(self) -> None:
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+class ShmTaskRing(ShmRing):
+    # (job, [(idx, payload), ...], t_put_ns) arba None
+    def __init__(self, max_batch: int, slots: int = RING_SLOTS) -> None:
+        super().__init__(slots, _HDR.size + max_batch * _TASK.size)
+        self.max_batch = max_batch
+
+    def put(self, item) -> None:
+        encoded = None
+        job = t_put = 0
+        if item is not None:
+            job, batch, t_put = item
+            if len(batch) > self.max_batch:
+                raise ValueError(f"Batch too large for ring slot: {len(batch)} > {self.max_batch}")
+            encoded = [(idx, payload.encode("utf-8")) for idx, payload in batch]
+            for idx, raw in encoded:
+                if len(raw) > PAYLOAD_MAX:
+                    raise ValueError(f"Payload too long for ring slot: {raw!r}")
+
+        def write(buf, off):
+            if encoded is None:
+                _HDR.pack_into(buf, off, STOP_COUNT, 0, 0)
+                return
+            _HDR.pack_into(buf, off, len(encoded), job, t_put)
+            off += _HDR.size
+            for idx, raw in encoded:
+                _TASK.pack_into(buf, off, idx, len(raw), raw)
+                off += _TASK.size
+
+        self._put(write)
+
+    def get(self, timeout=None):
+        def read(buf, off):
+            count, job, t_put = _HDR.unpack_from(buf, off)
+            if count == STOP_COUNT:
+                return None
+            off += _HDR.size
+            batch = []
+            for idx, ln, raw in _TASK.iter_unpack(buf[off:off + count * _TASK.size]):
+                batch.append((idx, raw[:ln].decode("utf-8")))
+            return job, batch, t_put
+
+        return self._get(read, timeout)
+
+class ShmResultRing(ShmRing):
+    # (job, [(idx, val), ...], [(dup_idx, first_idx), ...]), val - uint32
+    def __init__(self, max_batch: int, slots: int = RING_SLOTS) -> None:
+        super().__init__(slots, _RES_HDR.size + 2 * max_batch * _RES.size)
+        self.max_batch = max_batch
+
+    def put(self, item) -> None:
+        job, batch, refs = item
+        if len(batch) > self.max_batch or len(refs) > self.max_batch:
+            raise ValueError(f"Batch too large for ring slot: {max(len(batch), len(refs))} > {self.max_batch}")
+        flat = [x for pair in batch for x in pair]
+        flat += [x for pair in refs for x in pair]
+
+        def write(buf, off):
+            _RES_HDR.pack_into(buf, off, len(batch), job, len(refs))
+            struct.pack_into("<%dI" % len(flat), buf, off + _RES_HDR.size, *flat)
+
+        self._put(write)
+
+    def get(self, timeout=None):
+        def read(buf, off):
+            count, job, nrefs = _RES_HDR.unpack_from(buf, off)
+            off += _RES_HDR.size
+            mid = off + count * _RES.size
+            batch = list(_RES.iter_unpack(buf[off:mid]))
+            refs = list(_RES.iter_unpack(buf[mid:mid + nrefs * _RES.size]))
+            return job, batch, refs
+
+        return self._get(read, timeout)
+
+# =====================================================
+# Dublikatų sujungimas job'o viduje (PY_DEDUP=1)
+# -----------------------------------------------------
+# Receiver pusė (JobDedup): pirmas payload'o idx tampa
+# "first"; jis vienintelis keliauja į worker'ius. Vėlesni
+# tokie patys payload'ai skaičiuojami nebe worker'iuose,
+# o siunčiami kaip nuorodos (dup_idx, first_idx) tiesiai
+# į sender pusę (per q_out, kartu su rezultatais).
+#
+# Sender pusė (FanOut): prisimena first_idx -> val ir
+# išskleidžia nuorodas. Nuoroda gali atkeliauti anksčiau
+# nei first rezultatas – tada ji palaukia `waiting`.
+# =====================================================
+class JobDedup:
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.first: dict = {}  # payload -> first idx
+
+    def first_idx(self, idx: int, payload: str):
+        # None -> naujas payload (reikia skaičiuoti), kitaip first idx
+        if not self.enabled:
+            return None
+        first = self.first.get(payload)
+        if first is None:
+            self.first[payload] = idx
+        return first
+
+class FanOut:
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.values: dict = {}   # first idx -> val
+        self.waiting: dict = {}  # first idx -> [dup idx, ...]
+        self.computed = 0
+        self.dups = 0
+
+    def add_results(self, batch):
+        # grąžina (idx, val) porų sąrašą, kurias jau galima siųsti
+        self.computed += len(batch)
+        if not self.enabled:
+            return batch
+        out = list(batch)
+        for idx, val in batch:
+            self.values[idx] = val
+            for dup in self.waiting.pop(idx, ()):
+                out.append((dup, val))
+        return out
+
+    def add_refs(self, refs):
+        self.dups += len(refs)
+        out = []
+        for dup, first in refs:
+            if first in self.values:
+                out.append((dup, self.values[first]))
+            else:
+                self.waiting.setdefault(first, []).append(dup)
+        return out
+
+    def summary(self) -> str:
+        total = self.computed + self.dups
+        ratio = total / self.computed if self.computed else 1.0
+        return f"computed {self.computed}, deduplicated {self.dups} (x{ratio:.2f})"
+
+# =====================================================
+# Rezultatų pristatymo tvarka (PY_DELIVERY)
+# -----------------------------------------------------
+# Sender'is po FanOut kiekvieną paruoštą porų sąrašą
+# praleidžia per delivery objektą:
+#   push(ready) -> ką siųsti dabar
+#   flush()     -> likutis, kai job'o rezultatai baigėsi
+#   - unordered: kaip atkeliavo (numatytasis)
+#   - ordered:   griežtai pagal idx (heap), bet buferis
+#                ribotas PY_REORDER_WINDOW; jį viršijus
+#                išleidžiamas mažiausias idx net jei prieš
+#                jį dar yra "skylė"
+#   - runs:      siunčiami ištisiniai idx intervalai, kai
+#                jie pasiekia PY_RUN_MIN ilgį arba prisijungia
+#                prie jau išsiųstos pradžios; perpildžius
+#                langą – išleidžiami visi buferio intervalai
+# high_water – didžiausias buferio dydis (ordered/runs).
+# =====================================================
+class UnorderedDelivery:
+    def __init__(self, window: int, run_min: int) -> None:
+        self.high_water = 0
+
+    def push(self, ready):
+        return ready
+
+    def flush(self):
+        return []
+
+class OrderedDelivery:
+    def __init__(self, window: int, run_min: int) -> None:
+        self.window = window
+        self.heap = []
+        self.next_idx = 0
+        self.high_water = 0
+
+    def push(self, ready):
+        out = []
+        for pair in ready:
+            heapq.heappush(self.heap, pair)
+            self.high_water = max(self.high_water, len(self.heap))
+            while self.heap and (self.heap[0][0] <= self.next_idx or len(self.heap) > self.window):
+                idx, val = heapq.heappop(self.heap)
+                out.append((idx, val))
+                self.next_idx = max(self.next_idx, idx + 1)
+        return out
+
+    def flush(self):
+        out = [heapq.heappop(self.heap) for _ in range(len(self.heap))]
+        if out:
+            # heap gali turėti tarpų: toliau – po didžiausio išleisto idx
+            self.next_idx = max(self.next_idx, out[-1][0] + 1)
+        return out
+
+class RunsDelivery:
+    def __init__(self, window: int, run_min: int) -> None:
+        self.window = window
+        self.run_min = run_min
+        self.vals: dict = {}      # buferizuoti idx -> val
+        self.run_end: dict = {}   # intervalo pradžia -> pabaiga
+        self.run_start: dict = {} # intervalo pabaiga -> pradžia
+        self.next_idx = 0         # [0, next_idx) jau išsiųsta ištisai
+        self.sent: dict = {}      # išsiųsti intervalai už next_idx: pradžia -> pabaiga
+        self.high_water = 0
+
+    def _take(self, start: int):
+        end = self.run_end.pop(start)
+        del self.run_start[end]
+        if start == self.next_idx:
+            # prefiksas pasiekė anksčiau išsiųstus intervalus – prijungiam juos
+            self.next_idx = end + 1
+            while self.next_idx in self.sent:
+                self.next_idx = self.sent.pop(self.next_idx) + 1
+        else:
+            self.sent[start] = end
+        return [(i, self.vals.pop(i)) for i in range(start, end + 1)]
+
+    def push(self, ready):
+        out = []
+        starts = []
+        for idx, val in ready:
+            self.vals[idx] = val
+            start = end = idx
+            if idx - 1 in self.run_start:
+                start = self.run_start.pop(idx - 1)
+            if idx + 1 in self.run_end:
+                end = self.run_end.pop(idx + 1)
+                del self.run_start[end]
+            self.run_end[start] = end
+            self.run_start[end] = start
+            starts.append(start)
+            self.high_water = max(self.high_water, len(self.vals))
+            if len(self.vals) > self.window:
+                out += self.flush()
+
+        for start in sorted(set(starts)):
+            end = self.run_end.get(start)
+            if end is not None and (end - start + 1 >= self.run_min or start == self.next_idx):
+                out += self._take(start)
+        return out
+
+    def flush(self):
+        out = []
+        for start in sorted(self.run_end):
+            out += self._take(start)
+        return out
+
+DELIVERY = {"unordered": UnorderedDelivery, "ordered": OrderedDelivery, "runs": RunsDelivery}
+
+# =====================================================
+# Backpressure (PY_HIGH_WATER / PY_LOW_WATER)
+# -----------------------------------------------------
+# in_flight = užduotys, kurias receiver jau išdalino, bet
+# sender dar neišsiuntė (eilėse, worker'iuose, FanOut ir
+# delivery buferiuose).
+#   - receiver po kiekvieno paketo acquire(k): jei
+#     in_flight >= high, nebeskaito socket'o, kol nenukris
+#     iki low (TCP langas prisipildo ir C++ siuntėjas stoja)
+#   - sender release(k) tik po to, kai įrašė į socket'ą,
+#     todėl lėtas C++ skaitytojas 5001 porte stabdo visą
+#     grandinę
+# Taip q_in/q_out turinys ribotas ~high + vienas paketas.
+# high=0 – išjungta (neribota, kaip anksčiau).
+# =====================================================
+class FlowControl:
+    def __init__(self, high: int, low: int) -> None:
+        self.high = high
+        self.low = low
+        self.in_flight = mp.Value("q", 0)
+        self.peak = mp.Value("q", 0)
+        self.stalls = mp.Value("q", 0)
+        self.cond = mp.Condition(self.in_flight.get_lock())
+
+    def acquire(self, k: int, stop_event) -> None:
+        with self.cond:
+            self.in_flight.value += k
+            self.peak.value = max(self.peak.value, self.in_flight.value)
+            if not self.high or self.in_flight.value < self.high:
+                return
+            self.stalls.value += 1
+            while self.in_flight.value > self.low and not stop_event.is_set():
+                self.cond.wait(timeout=0.5)
+
+    def release(self, k: int) -> None:
+        with self.cond:
+            self.in_flight.value -= k
+            if self.in_flight.value <= self.low:
+                self.cond.notify_all()
+
+    def take_stats(self):
+        # (peak in_flight, stalls) nuo praeito kvietimo
+        with self.cond:
+            stats = (self.peak.value, self.stalls.value)
+            self.peak.value = self.in_flight.value
+            self.stalls.value = 0
+        return stats
+
+class AsyncFlowControl:
+    # tas pats asyncio front end'ui (vienas procesas)
+    def __init__(self, high: int, low: int) -> None:
+        self.high = high
+        self.low = low
+        self.in_flight = 0
+        self.peak = 0
+        self.stalls = 0
+        self.cond = asyncio.Condition()
+
+    async def acquire(self, k: int) -> None:
+        self.in_flight += k
+        self.peak = max(self.peak, self.in_flight)
+        if not self.high or self.in_flight < self.high:
+            return
+        self.stalls += 1
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.in_flight <= self.low)
+
+    async def release(self, k: int) -> None:
+        self.in_flight -= k
+        if self.in_flight <= self.low:
+            async with self.cond:
+                self.cond.notify_all()
+
+    def take_stats(self):
+        stats = (self.peak, self.stalls)
+        self.peak = self.in_flight
+        self.stalls = 0
+        return stats
+
+# =====================================================
+# Peak RSS per job
+# -----------------------------------------------------
+# Linux: VmHWM iš /proc/self/status, o job'o pradžioje
+# jis nunulinamas per /proc/self/clear_refs ("5").
+# Kitur (macOS): ru_maxrss – viso proceso gyvavimo peak.
+# =====================================================
+def reset_peak_rss() -> None:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mib() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# =====================================================
+# Metrikos (per-stage) + stats portas (PY_STATS_PORT)
+# -----------------------------------------------------
+# Visi skaitikliai – mp.Array bendroje atmintyje, todėl
+# juos pildo receiver/worker'iai/sender, o skaito main
+# procesas. Etapai (matuojama per paketą):
+#   - recv:       socket'o skaitymas + parse iki flush
+#   - queue_wait: nuo q_in.put iki worker'io get
+#   - compute:    compute_batch trukmė
+#   - send:       encode + sendall
+# Kiekvienam etapui: paketai, užduotys, suminis laikas ir
+# log2 histograma (bucket b = trukmė < 2^b µs).
+# Worker'iams – busy laikas ir užduočių skaičius,
+# eilėms – paketų skaičius q_in / q_out.
+# Stats portas: GET / -> tas pats tekstas, kaip ir
+# išvedamas serverio pabaigoje.
+# =====================================================
+STAGES = ("recv", "queue_wait", "compute", "send")
+ST_RECV, ST_QUEUE_WAIT, ST_COMPUTE, ST_SEND = range(len(STAGES))
+HIST_BUCKETS = 24  # paskutinis bucket'as – viskas virš ~4 s
+Q_IN, Q_OUT = 0, 1
+
+class Metrics:
+    def __init__(self, worker_count: int) -> None:
+        self.worker_count = worker_count
+        self.t0 = time.monotonic_ns()
+        self.stage = mp.Array("Q", len(STAGES) * 3)  # batches, items, total_ns
+        self.hist = mp.Array("Q", len(STAGES) * HIST_BUCKETS)
+        self.busy = mp.Array("Q", worker_count * 2)  # busy_ns, tasks
+        self.depth = mp.Array("q", 2)                # q_in, q_out paketais
+
+    def observe(self, stage: int, ns: int, items: int) -> None:
+        bucket = min(HIST_BUCKETS - 1, (ns // 1000).bit_length())
+        with self.stage.get_lock():
+            self.stage[stage * 3] += 1
+            self.stage[stage * 3 + 1] += items
+            self.stage[stage * 3 + 2] += ns
+            self.hist[stage * HIST_BUCKETS + bucket] += 1
+
+    def worker(self, wid: int, ns: int, items: int) -> None:
+        with self.busy.get_lock():
+            self.busy[wid * 2] += ns
+            self.busy[wid * 2 + 1] += items
+
+    def queue(self, which: int, delta: int) -> None:
+        with self.depth.get_lock():
+            self.depth[which] += delta
+
+    def _percentile(self, stage: int, total: int, q: float) -> float:
+        # viršutinė bucket'o riba ms
+        if not total:
+            return 0.0
+        need = total * q
+        seen = 0
+        for b in range(HIST_BUCKETS):
+            seen += self.hist[stage * HIST_BUCKETS + b]
+            if seen >= need:
+                return (1 << b) / 1000
+        return float("inf")
+
+    def format(self, in_flight=None) -> str:
+        wall = (time.monotonic_ns() - self.t0) / 1e9
+        lines = [f"uptime_s {wall:.3f}",
+                 f"{'stage':<11}{'batches':>9}{'tasks':>11}{'total_s':>10}{'mean_ms':>10}"
+                 f"{'p50_ms':>9}{'p90_ms':>9}{'p99_ms':>9}"]
+        with self.stage.get_lock():
+            for i, name in enumerate(STAGES):
+                batches, items, total = self.stage[i * 3:i * 3 + 3]
+                mean = total / batches / 1e6 if batches else 0.0
+                lines.append(f"{name:<11}{batches:>9}{items:>11}{total / 1e9:>10.3f}{mean:>10.3f}"
+                             f"{self._percentile(i, batches, 0.5):>9.3f}"
+                             f"{self._percentile(i, batches, 0.9):>9.3f}"
+                             f"{self._percentile(i, batches, 0.99):>9.3f}")
+        depth = f"queue_depth q_in={self.depth[Q_IN]} q_out={self.depth[Q_OUT]}"
+        if in_flight is not None:
+            depth += f" in_flight={in_flight}"
+        lines.append(depth)
+        with self.busy.get_lock():
+            for w in range(self.worker_count):
+                busy, tasks = self.busy[w * 2], self.busy[w * 2 + 1]
+                util = busy / 1e9 / wall * 100 if wall else 0.0
+                lines.append(f"worker {w:<3} busy {util:5.1f}% | tasks {tasks}")
+        return "\n".join(lines) + "\n"
+
+def serve_stats(metrics: Metrics, port: int, in_flight) -> "ThreadingHTTPServer | None":
+    # in_flight: funkcija, grąžinanti dabartinį flow control in_flight;
+    # užimtas portas – tik įspėjimas (None), serveris dirba toliau
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            body = metrics.format(in_flight()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    try:
+        httpd = ThreadingHTTPServer((HOST, port), Handler)
+    except OSError as e:
+        print(f"[PY][STATS] port {port} unavailable ({e}), stats disabled")
+        return None
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print(f"[PY][STATS] http://{HOST}:{port}/")
+    return httpd
+
 # =====================================================
 # Worker procesas
 # -----------------------------------------------------
-# Ima užduotis iš q_in:
-#    (idx, payload)
+# Ima užduočių paketus iš q_in:
+#    (job, [(idx, payload), ...], t_put_ns)
 # Paskaičiuoja:
-#    val = cpu_heavy_py(payload)
-# Ir padeda į q_out:
-#    (idx, val)
+#    val = cpu_heavy_py(payload)  (per compute_batch, su cache jei yra)
+# Ir padeda į q_out visą paketą su tuo pačiu job id:
+#    (job, [(idx, val), ...], [])
 #
 # Stabdymas:
-#   - kai gauna None
+#   - kai gauna None (pabaigoje arba kai WorkerPool mažina pool'ą)
 #   - arba stop_event yra set()
 # =====================================================
-def worker_loop(q_in: mp.Queue, q_out: mp.Queue, rounds: int, stop_event) -> None:
+def worker_loop(wid: int, q_in: mp.Queue, q_out: mp.Queue, rounds: int, stop_event,
+                metrics: Metrics, cache: ResultCache = None, cpus=None) -> None:
+    pin_to(cpus)
     while not stop_event.is_set():
         item = q_in.get()
         if item is None:
             break
-        idx, payload = item
-        val = cpu_heavy_py(payload, rounds)
-        q_out.put((idx, val))
+        job, batch, t_put = item
+        t0 = time.monotonic_ns()
+        metrics.queue(Q_IN, -1)
+        metrics.observe(ST_QUEUE_WAIT, t0 - t_put, len(batch))
+        results = compute_batch(batch, rounds, cache)
+        ns = time.monotonic_ns() - t0
+        metrics.observe(ST_COMPUTE, ns, len(batch))
+        metrics.worker(wid, ns, len(batch))
+        q_out.put((job, results, []))
+        metrics.queue(Q_OUT, 1)
 
 # =====================================================
 # Receiver procesas (priima tasks iš C++)
 # -----------------------------------------------------
 # 1) listen PORT_IN
-# 2) accept
-# 3) perskaito "BEGIN n"
-# 4) meta_q.put(n) -> praneša sender procesui kiek bus rezultatų
-# 5) skaito n eilučių: "idx;payload" -> q_in.put(...)
+# 2) accept (kiekvienai sesijai iš naujo)
+# 3) perskaito "BEGIN n" (arba "BEGIN n BIN")
+# 4) meta_q.put((job, n, binary)) -> praneša sender procesui kiek bus rezultatų
+# 5) skaito n užduočių: "idx;payload" (arba binarinius įrašus)
+#    -> kaupia paketą -> q_in.put((job, [...]))
+#    (pasikartojantys payload'ai -> q_out.put((job, [], [(dup, first), ...])))
 # 6) skaito "END"
-# 7) į q_in įdeda None worker'iams
+# 7) kartoja 2-6 kol aptarnauja `sessions` sesijų (0 = be galo)
+# Jei sesija nutrūksta (klientas atsijungė, blogas srautas),
+# nutraukiamas tik tas job'as: meta_q.put((job, None, missing))
+# pasako sender'iui, kiek rezultatų niekada neateis, ir
+# receiver'is laukia kito kliento.
+# (None worker'iams įdeda main per WorkerPool.stop(), nes
+#  worker'ių skaičius gali keistis)
 # =====================================================
-def receiver_process(q_in: mp.Queue, meta_q: mp.Queue, worker_count: int, stop_event) -> None:
+def read_tasks(reader: ConnReader, n: int, binary: bool):
+    # generatorius: (idx, payload) n kartų
+    if not binary:
+        for _ in range(n):
+            idx_s, payload = reader.readline().strip().split(";", 1)
+            yield int(idx_s), payload
+        return
+    left = n
+    while left:
+        k = min(left, BIN_CHUNK)
+        # bytes(): memoryview negali likti gyvas, kol buferis keičiamas
+        for idx, games, winning in _BIN_TASK.iter_unpack(bytes(reader.read_exact(k * _BIN_TASK.size))):
+            yield idx, bin_payload(games, winning)
+        left -= k
+
+def receive_job(conn: socket.socket, job: int, q_in: mp.Queue, q_out: mp.Queue, meta_q: mp.Queue,
+                worker_count: int, max_batch: int, dedup: bool, sched: str, flow: FlowControl,
+                metrics: Metrics, stop_event) -> int:
+    reader = ConnReader(conn)
+    n = 0
+    announced = False
+    queued = 0  # kiek idx jau išleista į q_in/q_out
+    batch = []
+    refs = []
+    t_read = time.monotonic_ns()
+
+    def flush() -> None:
+        # išleidžiam VISKĄ, ką laikom (užduotis prieš nuorodas į jas),
+        # kad flow.acquire užsiblokavus sender'is nelauktų mūsų rankose
+        # esančių idx
+        nonlocal batch, refs, t_read, queued
+        k = len(batch) + len(refs)
+        queued += k
+        now = time.monotonic_ns()
+        if k:
+            metrics.observe(ST_RECV, now - t_read, k)
+        if batch:
+            q_in.put((job, batch, now))
+            metrics.queue(Q_IN, 1)
+            batch = []
+        if refs:
+            q_out.put((job, [], refs))
+            metrics.queue(Q_OUT, 1)
+            refs = []
+        if k:
+            flow.acquire(k, stop_event)
+        t_read = time.monotonic_ns()
+
+    try:
+        # [JOB token] BEGIN n [BIN]; procs režime poros nustatomos
+        # jungimosi tvarka, todėl token'as tik praleidžiamas
+        header = reader.readline().strip()
+        if parse_job(header) is not None:
+            header = reader.readline().strip()
+        n, binary = parse_begin(header)
+
+        # informuojam sender'į, kiek rezultatų bus šiam job'ui ir kokiu formatu
+        meta_q.put((job, n, binary))
+        announced = True
+
+        # tasks (stream) -> paketais
+        chunks = SCHEDULERS[sched](n, worker_count, max_batch)
+        batch_size = chunks.next_size(n)
+        seen = JobDedup(dedup)
+        for i, (idx, payload) in enumerate(read_tasks(reader, n, binary)):
+            first = seen.first_idx(idx, payload)
+            if first is None:
+                batch.append((idx, payload))
+            else:
+                refs.append((idx, first))
+            if len(batch) >= batch_size or len(refs) >= max_batch:
+                flush()
+                batch_size = chunks.next_size(n - i - 1)
+        flush()
+
+        # END
+        end = reader.readline().strip()
+        if end != MSG_END:
+            raise ValueError(f"Bad end marker: {end!r} (expected 'END')")
+
+    except Exception:
+        # sender'is šio job'o result jungtį vis tiek priims, todėl
+        # meta visada turi būti (kad kiti job'ai nepasislinktų)
+        if not announced:
+            meta_q.put((job, 0, False))
+        meta_q.put((job, None, n - queued))
+        raise
+    return n
+
+def receiver_process(q_in: mp.Queue, q_out: mp.Queue, meta_q: mp.Queue, worker_count: int,
+                     max_batch: int, sessions: int, dedup: bool, sched: str, flow: FlowControl,
+                     metrics: Metrics, stop_event, cpus=None) -> None:
+    pin_to(cpus)
     srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     srv.bind((HOST, PORT_IN))
@@ -89,30 +987,24 @@ def receiver_process(q_in: mp.Queue, meta_q: mp.Queue, worker_count: int, stop_e
     print(f"[PY][RECV] Listening {HOST}:{PORT_IN}")
 
     try:
-        conn, addr = srv.accept()
-        with conn:
-            print(f"[PY][RECV] Connected from {addr}")
-
-            # BEGIN n
-            header = recv_line(conn).strip()
-            parts = header.split()
-            if len(parts) != 2 or parts[0] != MSG_BEGIN:
-                raise ValueError(f"Bad header: {header!r} (expected 'BEGIN n')")
-            n = int(parts[1])
-
-            # informuojam sender'į, kiek rezultatų bus
-            meta_q.put(n)
-
-            # tasks (stream)
-            for _ in range(n):
-                line = recv_line(conn).strip()
-                idx_s, payload = line.split(";", 1)
-                q_in.put((int(idx_s), payload))
-
-            # END
-            end = recv_line(conn).strip()
-            if end != MSG_END:
-                raise ValueError(f"Bad end marker: {end!r} (expected 'END')")
+        job = 0
+        while not stop_event.is_set() and (sessions == 0 or job < sessions):
+            conn, addr = srv.accept()
+            with conn:
+                print(f"[PY][RECV] Job {job}: connected from {addr}")
+                reset_peak_rss()
+                try:
+                    n = receive_job(conn, job, q_in, q_out, meta_q, worker_count, max_batch, dedup,
+                                    sched, flow, metrics, stop_event)
+                except (OSError, ValueError) as e:
+                    # nutraukiam tik šį job'ą (sender'is jį jau žino iš meta_q)
+                    print(f"[PY][RECV] Job {job}: aborted ({e}), dropping its results.")
+                    job += 1
+                    continue
+                peak, stalls = flow.take_stats()
+                print(f"[PY][RECV] Job {job}: received {n} tasks | peak in-flight {peak} | "
+                      f"stalls {stalls} | peak RSS {peak_rss_mib():.1f} MiB.")
+            job += 1
 
     except Exception:
         # jei kažkas blogai — stabdom viską
@@ -120,9 +1012,6 @@ def receiver_process(q_in: mp.Queue, meta_q: mp.Queue, worker_count: int, stop_e
         raise
 
     finally:
-        # VISADA duodam worker'iams pabaigos signalus
-        for _ in range(worker_count):
-            q_in.put(None)
         srv.close()
         print("[PY][RECV] Receiver exiting.")
 
@@ -130,43 +1019,203 @@ def receiver_process(q_in: mp.Queue, meta_q: mp.Queue, worker_count: int, stop_e
 # Sender procesas (stream’ina rezultatus į C++)
 # -----------------------------------------------------
 # 1) listen PORT_OUT
-# 2) accept
-# 3) n = meta_q.get()  (palaukia kol receiver pasakys n)
-# 4) siunčia "RESULTS n"
-# 5) stream’ina (idx,val) iš q_out kaip "idx;val"
+# 2) accept (kiekvienai sesijai iš naujo)
+# 3) (job, n, binary) = meta_q.get()  (palaukia kol receiver pasakys n)
+# 4) siunčia "RESULTS n" (arba "RESULTS n BIN")
+# 5) stream’ina job'o paketus [(idx,val), ...] iš q_out kaip "idx;val"
+#    (arba binarinius įrašus)
+#    (vienas paketas = vienas sendall), dublikatus išskleidžia FanOut,
+#    tvarką nustato PY_DELIVERY
 # 6) kai išsiunčia n -> siunčia "DONE"
+#
+# Jei receiver jau priima kitą job'ą, to job'o paketai
+# atidedami į `pending` ir išsiunčiami jo sesijoje.
+# Nutraukto job'o (receiver'io (job, None, missing) arba
+# atsijungęs result klientas) sesija baigiama be DONE, o jo
+# likę paketai išmetami, kai tik pasirodo q_out (SenderJobs).
+# q_out/meta_q laukiama po SENDER_POLL s, tikrinant stop_event.
 # =====================================================
-def sender_process(q_out: mp.Queue, meta_q: mp.Queue, stop_event) -> None:
+SENDER_POLL = 0.2
+def delivery_summary(delivery: str, order) -> str:
+    if delivery == "unordered":
+        return ""
+    return f" | {delivery}, reorder high-water {order.high_water}"
+
+class SenderJobs:
+    # sender'io job'ų apskaita: meta_q pranešimai ir q_out paketai
+    def __init__(self, meta_q: mp.Queue, q_out: mp.Queue, flow: FlowControl, metrics: Metrics) -> None:
+        self.meta_q = meta_q
+        self.q_out = q_out
+        self.flow = flow
+        self.metrics = metrics
+        self.metas = deque()   # (job, n, binary), dar neaptarnauti
+        self.left = {}         # job -> kiek idx dar turi ateiti per q_out
+        self.aborted = set()   # receiver'io nutraukti job'ai
+        self.dropping = set()  # job'ai, kurių paketus tiesiog išmetam
+        self.pending = {}      # job -> [(batch, refs), ...]
+
+    def _take_meta(self, item) -> None:
+        job, n, extra = item
+        if n is None:
+            if job not in self.left:
+                return  # job'as jau pilnai išsiųstas
+            self.left[job] -= extra
+            self.aborted.add(job)
+            self._forget_if_done(job)
+        else:
+            self.left[job] = n
+            self.metas.append(item)
+
+    def poll(self) -> None:
+        while True:
+            try:
+                self._take_meta(self.meta_q.get_nowait())
+            except queue.Empty:
+                return
+
+    def next_meta(self, stop_event):
+        # laukiam (job, n, binary) iš receiver proceso; None = stop
+        while not self.metas:
+            if stop_event.is_set():
+                return None
+            try:
+                self._take_meta(self.meta_q.get(timeout=SENDER_POLL))
+            except queue.Empty:
+                pass
+        return self.metas.popleft()
+
+    def _count(self, job: int, batch, refs) -> None:
+        self.left[job] -= len(batch) + len(refs)
+        self.metrics.queue(Q_OUT, -1)
+
+    def _discard(self, job: int, batch, refs) -> None:
+        self._count(job, batch, refs)
+        self.flow.release(len(batch) + len(refs))
+        self._forget_if_done(job)
+
+    def _forget_if_done(self, job: int) -> None:
+        if job in self.dropping and self.left[job] <= 0:
+            self.dropping.discard(job)
+            self.aborted.discard(job)
+            del self.left[job]
+
+    def drop(self, job: int) -> None:
+        # job'o nebesiunčiam: išmetam atidėtus ir visus vėlesnius paketus
+        self.dropping.add(job)
+        for batch, refs in self.pending.pop(job, []):
+            self._discard(job, batch, refs)
+        self._forget_if_done(job)
+
+    def finish(self, job: int) -> None:
+        self.pending.pop(job, None)
+        self.aborted.discard(job)
+        self.left.pop(job, None)
+
+    def next_batch(self, job: int, stop_event):
+        # -> (batch, refs) šiam job'ui; None, jei per SENDER_POLL nieko
+        # neatėjo (tada kviečiantysis patikrina poll()/aborted) arba stop
+        waiting = self.pending.get(job)
+        if waiting:
+            batch, refs = waiting.pop()
+            self._count(job, batch, refs)
+            return batch, refs
+        while not stop_event.is_set():
+            try:
+                got_job, batch, refs = self.q_out.get(timeout=SENDER_POLL)
+            except queue.Empty:
+                return None
+            if got_job == job:
+                self._count(job, batch, refs)
+                return batch, refs
+            if got_job in self.dropping:
+                self._discard(got_job, batch, refs)
+            else:
+                self.pending.setdefault(got_job, []).append((batch, refs))
+        return None
+
+def sender_process(q_out: mp.Queue, meta_q: mp.Queue, sessions: int, dedup: bool,
+                   delivery: str, window: int, run_min: int, flow: FlowControl, metrics: Metrics,
+                   stop_event, cpus=None) -> None:
+    pin_to(cpus)
     srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     srv.bind((HOST, PORT_OUT))
     srv.listen(1)
     print(f"[PY][SEND] Listening {HOST}:{PORT_OUT}")
 
-    try:
-        conn, addr = srv.accept()
-        with conn:
-            print(f"[PY][SEND] Connected from {addr}")
+    jobs = SenderJobs(meta_q, q_out, flow, metrics)
+    served = 0
 
-            # laukiam "n" iš receiver proceso
-            n = meta_q.get()
+    try:
+        while not stop_event.is_set() and (sessions == 0 or served < sessions):
+            conn, addr = srv.accept()
+            served += 1
 
-            # iškart pasakom C++ kiek bus rezultatų
-            send_line(conn, f"{MSG_RESULTS} {n}")
+            meta = jobs.next_meta(stop_event)
+            if meta is None:
+                conn.close()
+                break
+            job, n, binary = meta
+            print(f"[PY][SEND] Job {job}: connected from {addr}")
+            reset_peak_rss()
 
-            # streaminam rezultatus, kai tik atsiranda q_out
+            received = 0
             sent = 0
-            while sent < n:
-                if stop_event.is_set():
-                    break
-                idx, val = q_out.get()
-                send_line(conn, f"{idx};{val}")
-                sent += 1
+            fan = FanOut(dedup)
+            order = DELIVERY[delivery](window, run_min)
+            try:
+                with conn:
+                    writer = ConnWriter(conn)
+
+                    # iškart pasakom C++ kiek bus rezultatų
+                    writer.write_line(f"{MSG_RESULTS} {n} {MODE_BIN}" if binary else f"{MSG_RESULTS} {n}")
+                    writer.flush()
+
+                    # streaminam šio job'o rezultatų paketus
+                    while jobs.left[job] > 0 and job not in jobs.aborted:
+                        if stop_event.is_set():
+                            break
+                        got = jobs.next_batch(job, stop_event)
+                        if got is None:
+                            jobs.poll()
+                            continue
+                        batch, refs = got
+                        ready = fan.add_results(batch) + fan.add_refs(refs)
+                        received += len(ready)
+                        out = order.push(ready)
+                        if received == n:
+                            out += order.flush()
+                        t0 = time.monotonic_ns()
+                        writer.write_bytes(encode_results(out, binary))
+                        writer.flush()
+                        metrics.observe(ST_SEND, time.monotonic_ns() - t0, len(out))
+                        sent += len(out)
+                        flow.release(len(out))
+
+                    jobs.poll()
+                    if job in jobs.aborted:
+                        print(f"[PY][SEND] Job {job}: aborted by receiver after {sent}/{n} results, "
+                              f"dropping the rest.")
+                        flow.release(received - sent)
+                        jobs.drop(job)
+                        continue
+                    if sent == n and not stop_event.is_set():
+                        writer.write_line(MSG_DONE)
+                    writer.flush()
 
-            if sent == n and not stop_event.is_set():
-                send_line(conn, MSG_DONE)
+            except (BrokenPipeError, ConnectionError, OSError):
+                # klientas atsijungė: jei dar bus sesijų, likusius šio
+                # job'o rezultatus išmetam, kai tik jie ateis
+                if sessions != 0 and served >= sessions:
+                    raise
+                print(f"[PY][SEND] Job {job}: client disconnected, dropping results.")
+                flow.release(received - sent)
+                jobs.drop(job)
+                continue
 
-            print(f"[PY][SEND] Sent {sent}/{n} results.")
+            jobs.finish(job)
+            print(f"[PY][SEND] Job {job}: sent {sent}/{n} results | {fan.summary()}"
+                  f"{delivery_summary(delivery, order)} | peak RSS {peak_rss_mib():.1f} MiB.")
 
     except (BrokenPipeError, ConnectionError, OSError):
         stop_event.set()
@@ -175,13 +1224,488 @@ def sender_process(q_out: mp.Queue, meta_q: mp.Queue, stop_event) -> None:
         srv.close()
         print("[PY][SEND] Sender exiting.")
 
+# =====================================================
+# asyncio front end (PY_FRONTEND=asyncio)
+# -----------------------------------------------------
+# Vienas procesas su event loop'u aptarnauja abu portus,
+# CPU darbas eina į ProcessPoolExecutor paketais.
+#   - task jungtis (PORT_IN) sukuria AsyncJob
+#   - result jungtis (PORT_OUT) jį susiranda pagal PY_PAIRING:
+#       * "order" (numatytasis, C++ klientas): pasiima
+#         seniausią AsyncJob iš `unpaired` eilės, t.y. kaip
+#         procs režime poros nustatomos jungimosi tvarka.
+#         Klientai turi jungtis pirma 5000, po to 5001 ir
+#         nepersidengti: kitaip du vienu metu besijungiantys
+#         klientai gali gauti vienas kito rezultatus.
+#       * "token": abi jungtys pirma eilute siunčia
+#         "JOB token" (task – prieš BEGIN), poros sujungiamos
+#         per `by_token`; saugu keliems klientams vienu metu
+#   - kiekvienas paketas = vienas future; kai jis baigiasi,
+#     rezultatai iškart keliauja į job'o `results` eilę
+#     (dublikatų nuorodos ten dedamos tiesiai kaip sąrašas)
+# Taip nereikia nei receiver/sender procesų, nei meta_q,
+# o keli klientai vienu metu dalinasi tuo pačiu pool'u.
+# =====================================================
+_pool_metrics: Metrics = None  # pool procese, nustato init_pool_worker
+_pool_wid = 0
+
+def init_pool_worker(metrics: Metrics, next_wid, plan=None) -> None:
+    global _pool_metrics, _pool_wid
+    _pool_metrics = metrics
+    with next_wid.get_lock():
+        _pool_wid = next_wid.value
+        next_wid.value += 1
+    if plan:
+        pin_to(plan.worker(_pool_wid))
+
+def pool_compute(batch, rounds: int, cache: ResultCache, t_submit: int):
+    # compute_batch pool'e + tos pačios metrikos kaip worker_loop
+    t0 = time.monotonic_ns()
+    _pool_metrics.queue(Q_IN, -1)
+    _pool_metrics.observe(ST_QUEUE_WAIT, t0 - t_submit, len(batch))
+    results = compute_batch(batch, rounds, cache)
+    ns = time.monotonic_ns() - t0
+    _pool_metrics.observe(ST_COMPUTE, ns, len(batch))
+    _pool_metrics.worker(_pool_wid, ns, len(batch))
+    return results
+
+class AsyncJob:
+    def __init__(self, job: int) -> None:
+        self.job = job
+        self.n: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.binary = False
+        self.acquired = 0  # kiek užduočių užskaityta flow control
+        self.results: asyncio.Queue = asyncio.Queue()
+
+class AsyncFrontend:
+    def __init__(self, pool: ProcessPoolExecutor, worker_count: int, rounds: int,
+                 max_batch: int, sessions: int, dedup: bool, cache: ResultCache = None,
+                 sched: str = "static", delivery: str = "unordered",
+                 window: int = 4096, run_min: int = 64, high: int = 0, low: int = 0,
+                 metrics: Metrics = None, pairing: str = "order") -> None:
+        self.pool = pool
+        self.pairing = pairing
+        self.metrics = metrics
+        self.flow = AsyncFlowControl(high, low)
+        self.delivery = delivery
+        self.window = window
+        self.run_min = run_min
+        self.sched = sched
+        self.dedup = dedup
+        self.cache = cache
+        self.worker_count = worker_count
+        self.rounds = rounds
+        self.max_batch = max_batch
+        self.sessions = sessions
+        self.next_job = 0
+        self.served = 0
+        self.unpaired: asyncio.Queue = asyncio.Queue()  # PY_PAIRING=order
+        self.by_token: dict = {}  # PY_PAIRING=token: token -> Future[AsyncJob]
+        self.finished = asyncio.Event()
+
+    def _result_ready(self, job: AsyncJob, item) -> None:
+        job.results.put_nowait(item)
+        self.metrics.queue(Q_OUT, 1)
+
+    async def _flush(self, job: AsyncJob, batch, refs, t_read: int) -> None:
+        # kaip receive_job flush(): užduotys prieš nuorodas, tada flow control
+        loop = asyncio.get_running_loop()
+        k = len(batch) + len(refs)
+        now = time.monotonic_ns()
+        if k:
+            self.metrics.observe(ST_RECV, now - t_read, k)
+        if batch:
+            fut = loop.run_in_executor(self.pool, pool_compute, batch, self.rounds, self.cache, now)
+            self.metrics.queue(Q_IN, 1)
+            fut.add_done_callback(lambda f: self._result_ready(job, f))
+        if refs:
+            self._result_ready(job, refs)
+        if k:
+            job.acquired += k
+            await self.flow.acquire(k)
+
+    async def _read_tasks(self, reader: asyncio.StreamReader, n: int, binary: bool):
+        # async read_tasks analogas: (i, (idx, payload))
+        if not binary:
+            for i in range(n):
+                line = (await reader.readline()).decode("utf-8").strip()
+                if not line:
+                    raise ConnectionError("Socket closed")
+                idx_s, payload = line.split(";", 1)
+                yield i, (int(idx_s), payload)
+            return
+        i = 0
+        while i < n:
+            k = min(n - i, BIN_CHUNK)
+            data = await reader.readexactly(k * _BIN_TASK.size)
+            for idx, games, winning in _BIN_TASK.iter_unpack(data):
+                yield i, (idx, bin_payload(games, winning))
+                i += 1
+
+    def _token_slot(self, token: str) -> asyncio.Future:
+        # bendras task ir result pusei: kuri ateina pirma, ta sukuria
+        return self.by_token.setdefault(token, asyncio.get_running_loop().create_future())
+
+    async def _pair(self, reader: asyncio.StreamReader) -> AsyncJob:
+        if self.pairing == "order":
+            return await self.unpaired.get()
+        line = (await reader.readline()).decode("utf-8").strip()
+        token = parse_job(line)
+        if token is None:
+            raise ValueError(f"Bad pairing line: {line!r} (expected '{MSG_JOB} token')")
+        job = await self._token_slot(token)
+        del self.by_token[token]
+        return job
+
+    async def handle_tasks(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        job = AsyncJob(self.next_job)
+        self.next_job += 1
+        # ar result pusė gali šį job'ą rasti (klaidą reikia perduoti tik tada)
+        reachable = self.pairing == "order"
+        if reachable:
+            self.unpaired.put_nowait(job)
+        print(f"[PY][RECV] Job {job.job}: connected from {writer.get_extra_info('peername')}")
+
+        try:
+            # [JOB token] BEGIN n [BIN]
+            header = (await reader.readline()).decode("utf-8").strip()
+            token = parse_job(header)
+            if token is not None:
+                header = (await reader.readline()).decode("utf-8").strip()
+            if self.pairing == "token":
+                if token is None:
+                    raise ValueError(f"PY_PAIRING=token needs '{MSG_JOB} token' before BEGIN, got {header!r}")
+                slot = self._token_slot(token)
+                if slot.done():
+                    raise ValueError(f"Duplicate job token: {token!r}")
+                slot.set_result(job)
+                reachable = True
+            n, job.binary = parse_begin(header)
+            job.n.set_result(n)
+
+            # tasks (stream) -> paketais -> pool
+            chunks = SCHEDULERS[self.sched](n, self.worker_count, self.max_batch)
+            batch_size = chunks.next_size(n)
+            seen = JobDedup(self.dedup)
+            batch = []
+            refs = []
+            t_read = time.monotonic_ns()
+            async for i, (idx, payload) in self._read_tasks(reader, n, job.binary):
+                first = seen.first_idx(idx, payload)
+                if first is None:
+                    batch.append((idx, payload))
+                else:
+                    refs.append((idx, first))
+                if len(batch) >= batch_size or len(refs) >= self.max_batch:
+                    await self._flush(job, batch, refs, t_read)
+                    batch, refs = [], []
+                    batch_size = chunks.next_size(n - i - 1)
+                    t_read = time.monotonic_ns()
+            await self._flush(job, batch, refs, t_read)
+
+            # END
+            end = (await reader.readline()).decode("utf-8").strip()
+            if end != MSG_END:
+                raise ValueError(f"Bad end marker: {end!r} (expected 'END')")
+            peak, stalls = self.flow.take_stats()
+            print(f"[PY][RECV] Job {job.job}: received {n} tasks | peak in-flight {peak} | "
+                  f"stalls {stalls} | peak RSS {peak_rss_mib():.1f} MiB.")
+
+        except Exception as e:
+            # result pusė turi sužinoti, kad job'as nepavyko
+            if not reachable:
+                pass
+            elif not job.n.done():
+                job.n.set_exception(e)
+            else:
+                job.results.put_nowait(e)
+            print(f"[PY][RECV] Job {job.job}: failed: {e!r}")
+
+        finally:
+            writer.close()
+
+    async def handle_results(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            job = await self._pair(reader)
+        except (ValueError, ConnectionError) as e:
+            print(f"[PY][SEND] Pairing failed for {writer.get_extra_info('peername')}: {e!r}")
+            writer.close()
+            return
+        print(f"[PY][SEND] Job {job.job}: connected from {writer.get_extra_info('peername')}")
+
+        received = 0
+        sent = 0
+        n = None
+        fan = FanOut(self.dedup)
+        order = DELIVERY[self.delivery](self.window, self.run_min)
+        try:
+            n = await job.n
+            header = f"{MSG_RESULTS} {n} {MODE_BIN}" if job.binary else f"{MSG_RESULTS} {n}"
+            writer.write(f"{header}\n".encode("utf-8"))
+            await writer.drain()
+
+            # streaminam paketus ta tvarka, kuria baigiasi future'ai
+            while received < n:
+                item = await job.results.get()
+                if isinstance(item, Exception):
+                    raise item
+                self.metrics.queue(Q_OUT, -1)
+                if isinstance(item, list):
+                    ready = fan.add_refs(item)
+                else:
+                    ready = fan.add_results(item.result())
+                received += len(ready)
+                out = order.push(ready)
+                if received == n:
+                    out += order.flush()
+                t0 = time.monotonic_ns()
+                writer.write(encode_results(out, job.binary))
+                await writer.drain()
+                self.metrics.observe(ST_SEND, time.monotonic_ns() - t0, len(out))
+                sent += len(out)
+                await self.flow.release(len(out))
+
+            writer.write(f"{MSG_DONE}\n".encode("utf-8"))
+            await writer.drain()
+
+        except Exception as e:
+            print(f"[PY][SEND] Job {job.job}: failed: {e!r}")
+
+        finally:
+            writer.close()
+            # nepavykęs job'as neturi laikyti flow control vietos
+            await self.flow.release(job.acquired - sent)
+            job.acquired = sent
+            print(f"[PY][SEND] Job {job.job}: sent {sent}/{n} results | {fan.summary()}"
+                  f"{delivery_summary(self.delivery, order)}.")
+            self.served += 1
+            if self.sessions and self.served >= self.sessions:
+                self.finished.set()
+
+async def serve_asyncio(worker_count: int, rounds: int, max_batch: int, sessions: int,
+                        dedup: bool, cache: ResultCache = None, sched: str = "static", delivery: str = "unordered", window: int = 4096,
+                        run_min: int = 64, high: int = 0, low: int = 0, metrics: Metrics = None,
+                        stats_port: int = 0, plan=None, pairing: str = "order") -> None:
+    if plan:
+        pin_to(plan.io)
+    next_wid = mp.Value("i", 0)
+    with ProcessPoolExecutor(max_workers=worker_count, mp_context=mp.get_context(),
+                             initializer=init_pool_worker, initargs=(metrics, next_wid, plan)) as pool:
+        front = AsyncFrontend(pool, worker_count, rounds, max_batch, sessions, dedup, cache, sched,
+                              delivery, window, run_min, high, low, metrics, pairing)
+        httpd = serve_stats(metrics, stats_port, lambda: front.flow.in_flight) if stats_port else None
+        srv_in = await asyncio.start_server(front.handle_tasks, HOST, PORT_IN, limit=RECV_CHUNK)
+        srv_out = await asyncio.start_server(front.handle_results, HOST, PORT_OUT)
+        print(f"[PY][ASYNC] Listening {HOST}:{PORT_IN} and {HOST}:{PORT_OUT}")
+
+        async with srv_in, srv_out:
+            await front.finished.wait()
+
+        if httpd:
+            httpd.shutdown()
+
+# =====================================================
+# CPU pinning (PY_PIN=1)
+# -----------------------------------------------------
+# AffinityPlan padalina leidžiamus branduolius:
+#   - pirmas lieka C++ host'ui (OpenCL thread'as)
+#   - antras – receiver + sender (I/O procesai)
+#   - likę – worker'iams, wid % len(likę)
+# Jei branduolių < 3, I/O ir worker'iai dalinasi viskuo,
+# išskyrus C++ branduolį. Veikia tik ten, kur yra
+# os.sched_setaffinity (Linux); kitur – be pinning'o.
+# =====================================================
+class AffinityPlan:
+    def __init__(self, cpus) -> None:
+        cpus = sorted(cpus)
+        self.host = cpus[:1]
+        rest = cpus[1:] or cpus
+        if len(rest) >= 2:
+            self.io = rest[:1]
+            self.workers = rest[1:]
+        else:
+            self.io = rest
+            self.workers = rest
+
+    def worker(self, wid: int):
+        return [self.workers[wid % len(self.workers)]]
+
+    def describe(self) -> str:
+        return f"c++={self.host} io={self.io} workers={self.workers}"
+
+def pin_to(cpus) -> None:
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+def affinity_plan():
+    if not hasattr(os, "sched_getaffinity"):
+        print("[PY][PIN] os.sched_setaffinity not available, not pinning.")
+        return None
+    return AffinityPlan(os.sched_getaffinity(0))
+
+# =====================================================
+# Worker pool'as (procs front end)
+# -----------------------------------------------------
+# WorkerPool laiko gyvus worker procesus pagal wid:
+#   - grow():   paleidžia naują worker'į laisvu wid
+#   - shrink(): įdeda None į q_in – jį paėmęs worker'is
+#               baigia darbą (paketai prieš jį apdorojami)
+#   - stop():   None kiekvienam gyvam worker'iui
+#
+# Adaptyvus dydis (PY_ADAPTIVE=1): main kas ADAPT_INTERVAL
+# žiūri q_in gylį ir worker'ių busy laiką iš Metrics:
+#   - q_in > ADAPT_GROW_DEPTH paketų worker'iui -> grow,
+#     jei praeitas grow davė >= ADAPT_MIN_GAIN pralaidumo
+#     (kitaip dabartinis dydis laikomas "lubomis")
+#   - q_in tuščia ir utilizacija < ADAPT_SHRINK_UTIL -> shrink
+# Valdiklis veikia tol, kol gyvas sender'is (t.y. kol išsiųsti
+# visų darbų rezultatai), nes receiver'is paskutinį darbą
+# nuskaito ir baigiasi dar prieš jį apdorojant.
+# =====================================================
+ADAPT_INTERVAL = 0.5
+ADAPT_GROW_DEPTH = 2
+ADAPT_SHRINK_UTIL = 0.5
+ADAPT_MIN_GAIN = 1.05
+
+class WorkerPool:
+    def __init__(self, q_in, worker_args, slots: int, plan: AffinityPlan = None) -> None:
+        self.q_in = q_in
+        self.worker_args = worker_args  # (q_in, q_out, rounds, stop_event, metrics, cache)
+        self.slots = slots
+        self.plan = plan
+        self.procs: dict = {}  # wid -> Process
+        self.size = 0          # kiek worker'ių turėtų likti (be jau "atleistų")
+        self.closed = False    # po stop(): užduočių daugiau nebus
+
+    def _prune(self) -> None:
+        for wid, p in list(self.procs.items()):
+            if not p.is_alive():
+                p.join()
+                del self.procs[wid]
+
+    def grow(self) -> bool:
+        self._prune()
+        if self.size >= self.slots:
+            return False
+        wid = next(w for w in range(self.slots) if w not in self.procs)
+        cpus = self.plan.worker(wid) if self.plan else None
+        p = mp.Process(target=worker_loop, args=(wid, *self.worker_args, cpus), daemon=True)
+        p.start()
+        self.procs[wid] = p
+        self.size += 1
+        if self.closed:
+            # stop() sentinel'ai jau eilėje – naujam worker'iui savas
+            self.q_in.put(None)
+        return True
+
+    def shrink(self) -> bool:
+        if self.closed or self.size <= 1:
+            return False
+        self.q_in.put(None)
+        self.size -= 1
+        return True
+
+    def stop(self) -> None:
+        self._prune()
+        self.closed = True
+        for _ in self.procs:
+            self.q_in.put(None)
+
+    def join(self, timeout: float) -> None:
+        for p in self.procs.values():
+            p.join(timeout=timeout)
+
+class AdaptiveController:
+    def __init__(self, pool: WorkerPool, metrics: Metrics, min_workers: int, max_workers: int) -> None:
+        self.pool = pool
+        self.metrics = metrics
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.ceiling = max_workers
+        self.last_t = time.monotonic()
+        self.last_tasks, self.last_busy = self._totals()
+        self.rate_before_grow = None
+
+    def _totals(self):
+        with self.metrics.busy.get_lock():
+            busy = sum(self.metrics.busy[0::2])
+            tasks = sum(self.metrics.busy[1::2])
+        return tasks, busy
+
+    def step(self) -> None:
+        now = time.monotonic()
+        dt = now - self.last_t
+        if dt < ADAPT_INTERVAL:
+            return
+        tasks, busy = self._totals()
+        rate = (tasks - self.last_tasks) / dt
+        util = (busy - self.last_busy) / 1e9 / dt / max(1, self.pool.size)
+        self.last_t, self.last_tasks, self.last_busy = now, tasks, busy
+        depth = self.metrics.depth[Q_IN]
+
+        if self.rate_before_grow is not None and rate > 0:
+            # ar paskutinis grow apsimokėjo?
+            if rate < self.rate_before_grow * ADAPT_MIN_GAIN:
+                self.ceiling = self.pool.size
+            self.rate_before_grow = None
+
+        size = self.pool.size
+        if depth > ADAPT_GROW_DEPTH * size and size < min(self.ceiling, self.max_workers):
+            self.rate_before_grow = rate
+            if self.pool.grow():
+                print(f"[PY][POOL] grow -> {self.pool.size} workers (q_in={depth}, {rate:.0f} tasks/s)")
+        elif depth == 0 and util < ADAPT_SHRINK_UTIL and size > self.min_workers:
+            if self.pool.shrink():
+                print(f"[PY][POOL] shrink -> {self.pool.size} workers (util {util * 100:.0f}%)")
+
 # =====================================================
 # MAIN
 # -----------------------------------------------------
 # 1) paleidžia worker procesus (CPU parallel)
 # 2) paleidžia receiver procesą (PORT_IN)
 # 3) paleidžia sender procesą (PORT_OUT)
+#
+# PY_SESSIONS: kiek job'ų (C++ paleidimų) aptarnauti.
+#   1 (numatytasis) – vienas job'as, po jo serveris baigia
+#   0               – persistent režimas: worker'iai lieka
+#                     gyvi, sesijos priimamos be galo
+#
+# PY_FRONTEND: "procs" (numatytasis, receiver/sender procesai)
+#              arba "asyncio" (vienas event loop + pool)
+# PY_PAIRING: "order" (numatytasis, jungimosi tvarka) arba "token"
+#             ("JOB token" abiejose jungtyse; tik asyncio front end)
+#
+# PY_CACHE: rezultatų cache failas (tuščias = be cache),
+# PY_CACHE_SIZE: max įrašų skaičius (LRU)
+#
+# PY_DEDUP: 1 (numatytasis) – vienodi payload'ai job'e
+#           skaičiuojami vieną kartą; 0 – išjungta
+#
+# PY_SCHED: "static" (numatytasis) arba "guided" paketų dydžiai
+#
+# PY_DELIVERY: "unordered" (numatytasis), "ordered" arba "runs";
+# PY_REORDER_WINDOW: max buferizuotų rezultatų (ordered/runs),
+# PY_RUN_MIN: min intervalo ilgis (runs)
+#
+# PY_HIGH_WATER / PY_LOW_WATER: backpressure ribos užduotimis
+# (0 = išjungta; low numatytai high / 2)
+#
+# PY_STATS_PORT: metrikų HTTP portas (numatytai 0 = išjungta);
+# pabaigoje metrikos ir bendras laikas išvedami visada
+#
+# PY_ADAPTIVE=1: worker'ių skaičius kinta tarp PY_MIN_WORKERS
+# ir PY_MAX_WORKERS (tik procs front end); PY_WORKERS – pradinis
+# PY_PIN=1: CPU pinning pagal AffinityPlan
+# PY_START: spawn|forkserver|fork (žr. set_start_method)
 # =====================================================
+def report_cache(cache: ResultCache, before) -> None:
+    hits, misses, entries = cache.stats()
+    hits -= before[0]
+    misses -= before[1]
+    total = hits + misses
+    rate = hits / total * 100 if total else 0.0
+    print(f"[PY][CACHE] hits={hits} misses={misses} ({rate:.1f}% hit) | entries={entries}/{cache.max_entries} | {cache.path}")
+
 def main() -> None:
     cpu = os.cpu_count() or 4
 
@@ -190,46 +1714,168 @@ def main() -> None:
 
     worker_count = int(os.environ.get("PY_WORKERS", str(default_workers)))
     rounds = int(os.environ.get("PY_ROUNDS", "60000"))
+    max_batch = int(os.environ.get("PY_BATCH", "256"))
+    transport = os.environ.get("PY_TRANSPORT", "queue")
+    sessions = int(os.environ.get("PY_SESSIONS", "1"))
+    frontend = os.environ.get("PY_FRONTEND", "procs")
+    pairing = os.environ.get("PY_PAIRING", "order")
+    cache_path = os.environ.get("PY_CACHE", "")
+    cache_size = int(os.environ.get("PY_CACHE_SIZE", "100000"))
+    dedup = os.environ.get("PY_DEDUP", "1") != "0"
+    sched = os.environ.get("PY_SCHED", "static")
+    delivery = os.environ.get("PY_DELIVERY", "unordered")
+    window = int(os.environ.get("PY_REORDER_WINDOW", "4096"))
+    run_min = int(os.environ.get("PY_RUN_MIN", "64"))
+    high = int(os.environ.get("PY_HIGH_WATER", "65536"))
+    low = int(os.environ.get("PY_LOW_WATER", str(high // 2)))
+
+    if high and not 0 <= low < high:
+        raise ValueError(f"PY_LOW_WATER must be in [0, PY_HIGH_WATER): low={low}, high={high}")
+    stats_port = int(os.environ.get("PY_STATS_PORT", "0"))
+    adaptive = os.environ.get("PY_ADAPTIVE", "0") == "1"
+    min_workers = int(os.environ.get("PY_MIN_WORKERS", "1"))
+    max_workers = int(os.environ.get("PY_MAX_WORKERS", str(max(worker_count, cpu))))
+    pin = os.environ.get("PY_PIN", "0") == "1"
+
+    if pairing not in ("order", "token"):
+        raise ValueError(f"Unknown PY_PAIRING: {pairing!r} (expected 'order' or 'token')")
+    if pairing == "token" and frontend != "asyncio":
+        raise ValueError("PY_PAIRING=token is only supported with PY_FRONTEND=asyncio")
+    if adaptive and frontend != "procs":
+        raise ValueError("PY_ADAPTIVE=1 is only supported with PY_FRONTEND=procs")
+    if adaptive and not 1 <= min_workers <= worker_count <= max_workers:
+        raise ValueError(f"Need 1 <= PY_MIN_WORKERS <= PY_WORKERS <= PY_MAX_WORKERS "
+                         f"(got {min_workers}, {worker_count}, {max_workers})")
+    slots = max_workers if adaptive else worker_count
+    metrics = Metrics(slots)
+
+    plan = affinity_plan() if pin else None
+    if plan:
+        print(f"[PY][PIN] {plan.describe()}")
 
-    q_in: mp.Queue = mp.Queue()
-    q_out: mp.Queue = mp.Queue()
+    if high:
+        # reorder buferis negali laikyti daugiau nei low, kitaip receiver
+        # lauktų in_flight <= low, o sender – trūkstamų idx
+        window = min(window, low)
 
-    # meta_q naudojam tik vienam dalykui:
-    # perduoti "n" (kiek rezultatų bus) iš receiver -> sender
+    if delivery not in DELIVERY:
+        raise ValueError(f"Unknown PY_DELIVERY: {delivery!r} (expected one of {sorted(DELIVERY)})")
+
+    if sched not in SCHEDULERS:
+        raise ValueError(f"Unknown PY_SCHED: {sched!r} (expected one of {sorted(SCHEDULERS)})")
+
+    cache = ResultCache(cache_path, cache_size) if cache_path else None
+    cache_before = cache.stats() if cache else None
+
+    if frontend == "asyncio":
+        t0 = time.perf_counter()
+        asyncio.run(serve_asyncio(worker_count, rounds, max_batch, sessions, dedup, cache, sched,
+                                  delivery, window, run_min, high, low, metrics, stats_port, plan,
+                                  pairing))
+        if cache:
+            report_cache(cache, cache_before)
+        t1 = time.perf_counter()
+        print(f"[PY][STATS] Summary:\n{metrics.format()}", end="")
+        print(f"[PY] Server done in {t1 - t0:.3f} s workers={worker_count} | rounds={rounds} | batch<={max_batch} | sched={sched} | delivery={delivery} | frontend=asyncio | pairing={pairing} | start={mp.get_start_method()} | sessions={sessions or 'inf'}")
+        return
+    if frontend != "procs":
+        raise ValueError(f"Unknown PY_FRONTEND: {frontend!r} (expected 'procs' or 'asyncio')")
+
+    # q_in/q_out: mp.Queue (numatytasis) arba shared-memory žiedai
+    if transport == "shm":
+        q_in = ShmTaskRing(max_batch)
+        q_out = ShmResultRing(max_batch)
+    elif transport == "queue":
+        q_in = mp.Queue()
+        q_out = mp.Queue()
+    else:
+        raise ValueError(f"Unknown PY_TRANSPORT: {transport!r} (expected 'queue' or 'shm')")
+
+    # meta_q naudojam tik job'ų pranešimams receiver -> sender:
+    # (job, n, binary) (kiek rezultatų bus) ir, jei job'as nutrūko,
+    # (job, None, missing) (kiek jų neateis)
+    # (viena-dvi žinutės darbui, todėl lieka mp.Queue ir su shm)
     meta_q: mp.Queue = mp.Queue()
 
     stop_event = mp.Event()
+    flow = FlowControl(high, low)
+
+    httpd = serve_stats(metrics, stats_port, lambda: flow.in_flight.value) if stats_port else None
 
-    # 1) workers (vieną kartą)
-    workers = []
+    # 1) workers (pradinis kiekis)
+    pool = WorkerPool(q_in, (q_in, q_out, rounds, stop_event, metrics, cache), slots, plan)
     for _ in range(worker_count):
-        p = mp.Process(target=worker_loop, args=(q_in, q_out, rounds, stop_event), daemon=True)
-        p.start()
-        workers.append(p)
+        pool.grow()
+    controller = AdaptiveController(pool, metrics, min_workers, max_workers) if adaptive else None
 
     # 2) receiver + sender (atskirai)
-    p_recv = mp.Process(target=receiver_process, args=(q_in, meta_q, worker_count, stop_event), daemon=True)
-    p_send = mp.Process(target=sender_process, args=(q_out, meta_q, stop_event), daemon=True)
+    io_cpus = plan.io if plan else None
+    p_recv = mp.Process(target=receiver_process, args=(q_in, q_out, meta_q, worker_count, max_batch, sessions, dedup, sched, flow, metrics, stop_event, io_cpus), daemon=True)
+    p_send = mp.Process(target=sender_process, args=(q_out, meta_q, sessions, dedup, delivery, window, run_min, flow, metrics, stop_event, io_cpus), daemon=True)
 
     t0 = time.perf_counter()
     p_recv.start()
     p_send.start()
 
-    # laukiam kol baigs
+    # laukiam kol baigs (tuo metu – adaptyvus pool'o dydis);
+    # kai receiver'is baigia, užduočių daugiau nebus:
+    # pabaigos signalai worker'iams (eilėje po visų užduočių)
+    while p_send.is_alive():
+        p_send.join(timeout=ADAPT_INTERVAL)
+        if not pool.closed and not p_recv.is_alive():
+            pool.stop()
+        if controller:
+            controller.step()
     p_recv.join()
-    p_send.join()
+    if not pool.closed:
+        pool.stop()
 
     stop_event.set()
 
     # sujoininam workers
-    for p in workers:
-        p.join(timeout=2)
+    pool.join(timeout=2)
+
+    if transport == "shm":
+        q_in.unlink()
+        q_out.unlink()
+
+    if cache:
+        report_cache(cache, cache_before)
+
+    if httpd:
+        httpd.shutdown()
 
     t1 = time.perf_counter()
-    print(f"[PY] Server done workers={worker_count} | rounds={rounds}")
+    print(f"[PY][STATS] Summary:\n{metrics.format(flow.in_flight.value)}", end="")
+    workers_desc = f"{worker_count}..{pool.size} (adaptive)" if adaptive else str(worker_count)
+    print(f"[PY] Server done in {t1 - t0:.3f} s workers={workers_desc} | rounds={rounds} | batch<={max_batch} | sched={sched} | delivery={delivery} | transport={transport} | start={mp.get_start_method()} | sessions={sessions or 'inf'}")
+
+# =====================================================
+# Procesų paleidimo būdas (PY_START)
+# -----------------------------------------------------
+#   spawn      – kiekvienas procesas paleidžia naują Python
+#                interpretatorių ir iš naujo importuoja
+#                server.py (numatytasis, veikia visur)
+#   forkserver – vienas "švarus" serverio procesas su jau
+#                importuotais moduliais (FORKSERVER_PRELOAD);
+#                nauji procesai forkinami iš jo, todėl
+#                importų kaina mokama vieną kartą
+#   fork       – forkinama tiesiai iš main (greičiausia, bet
+#                tik POSIX ir paveldi visą main būseną)
+# Palyginimas: python bench.py startup
+# =====================================================
+START_METHODS = ("spawn", "forkserver", "fork")
+FORKSERVER_PRELOAD = ["__main__"]
+
+def set_start_method(method: str) -> None:
+    if method not in START_METHODS or method not in mp.get_all_start_methods():
+        raise ValueError(f"PY_START={method!r} not available here "
+                         f"(supported: {', '.join(mp.get_all_start_methods())})")
+    mp.set_start_method(method)
+    if method == "forkserver":
+        mp.set_forkserver_preload(FORKSERVER_PRELOAD)
 
 if __name__ == "__main__":
     # nusako kaip kuriami nauji procesai
-    # paleidžia visiškai naują Python interpretatorių
-    mp.set_start_method("spawn")
+    set_start_method(os.environ.get("PY_START", "spawn"))
     main()
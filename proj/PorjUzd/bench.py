@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+import main
+
+# =====================================================
+# Benchmark'ai parduotuvių išdėstymo optimizavimui
+# -----------------------------------------------------
+# Paleidimas (iš proj/PorjUzd):
+#   python bench.py solvers [--datasets S1 S5 S8] [--max-iter 1500]
+#   python bench.py scaling [--datasets S1 S8] [--sizes 2000x400]
+#                           [--backends vectorized threads] [--jobs 1 2 4]
+#                           [--csv out.csv] [--json out.json]
+#   python bench.py compare base.json new.json [--threshold 1.10]
+# =====================================================
+
+# Numatytieji solver'ių žingsniai (Adam'ui step = mokymosi greitis)
+SOLVER_STEPS = {
+    "fixed": 0.01,
+    "armijo": 0.01,
+    "bb": 0.01,
+    "nesterov": 0.01,
+    "adam": 0.05,
+    "lbfgs": 0.01,
+}
+
+def _datasets(names, sizes=()):
+    known = {name: (name, n, m) for name, n, m in main.DATASETS}
+    out = [known[name] for name in names] if names or sizes else list(main.DATASETS)
+    for size in sizes:
+        n, m = (int(v) for v in size.lower().split("x"))
+        out.append((f"n{n}m{m}", n, m))
+    return out
+
+# =====================================================
+# solvers: iteracijos, F/gradiento skaičiavimai ir laikas
+# kiekvienam solver'iui kiekviename S1–S8 rinkinyje
+# =====================================================
+def bench_solvers(args) -> None:
+    rows = []
+    for name, n, m in _datasets(args.datasets):
+        existing, x0 = main.make_dataset(n, m)
+        for solver in args.solvers:
+            t0 = time.perf_counter()
+            x, hist, _ = main.gradient_method(existing, x0, max_iter=args.max_iter, tol=args.tol,
+                                              step=SOLVER_STEPS[solver], track_every=args.max_iter,
+                                              solver=solver)
+            t1 = time.perf_counter()
+            last = hist[-1]
+            rows.append({"dataset": name, "n": n, "m": m, "solver": solver,
+                         "iters": last["iter"], "nfev": last["nfev"], "ngev": last["ngev"],
+                         "time_s": t1 - t0, "F": last["f"], "gnorm": last["gnorm"],
+                         "stop": last.get("stop", "")})
+            print(f"[BENCH][SOLVERS] {name} n={n:<4} m={m:<3} {solver:<9} iters={last['iter']:<5} "
+                  f"ngev={last['ngev']:<5} {t1 - t0:7.3f} s | F={last['f']:.6f} | {last.get('stop', '')}")
+
+    df = pd.DataFrame(rows)
+    print("\n=== Gradiento skaičiavimų kiekis (ngev) ===")
+    print(df.pivot(index="dataset", columns="solver", values="ngev")[args.solvers].to_string())
+    print("\n=== Laikas, s ===")
+    print(df.pivot(index="dataset", columns="solver", values="time_s")[args.solvers].round(3).to_string())
+
+# =====================================================
+# scaling: atskirų dalių ir viso metodo laikai
+# -----------------------------------------------------
+# Kiekvienam rinkiniui matuojama (mediana iš --repeats):
+#   objective, gradient_seq        – nepriklauso nuo backend'o
+#   gradient_parallel              – backend x n_jobs, per
+#                                    nuolatinį GradientExecutor
+#   gradient_method (--iters it.)  – backend x n_jobs
+# backend – išspręstas (resolve_backend, pvz. "auto" -> "threads");
+# n_jobs keičiamas tik pool'o backend'ams (threads, loky), kiti
+# matuojami 1 kartą su n_jobs=1, o jų speedup/efficiency – n/a.
+# speedup = to paties kernel/backend n_jobs=1 (arba mažiausio
+# n_jobs) mediana / mediana; efficiency = speedup / n_jobs.
+# =====================================================
+def _timeit(fn, repeats, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+def _row(name, n, m, kernel, backend, n_jobs, times):
+    q = statistics.quantiles(times, n=4) if len(times) > 1 else [times[0]] * 3
+    return {"dataset": name, "n": n, "m": m, "kernel": kernel, "backend": backend,
+            "n_jobs": n_jobs, "repeats": len(times), "median_s": statistics.median(times),
+            "min_s": min(times), "max_s": max(times), "iqr_s": q[2] - q[0]}
+
+POOLED = ("threads", "loky")
+
+def _add_speedup(df):
+    keys = ["dataset", "kernel", "backend"]
+    base = df.sort_values("n_jobs").groupby(keys)["median_s"].transform("first")
+    pooled = df["backend"].isin(POOLED)
+    df["speedup"] = (base / df["median_s"]).where(pooled)
+    df["efficiency"] = (df["speedup"] / df["n_jobs"]).where(pooled)
+    return df
+
+def bench_scaling(args) -> None:
+    rows = []
+    for name, n, m in _datasets(args.datasets, args.sizes):
+        existing, x0 = main.make_dataset(n, m)
+        x = x0.reshape(-1)
+        rows.append(_row(name, n, m, "objective", "-", 1,
+                         _timeit(lambda: main.objective(x, existing), args.repeats)))
+        if m * (n + m) <= args.seq_max_pairs:
+            rows.append(_row(name, n, m, "gradient_seq", "-", 1,
+                             _timeit(lambda: main.gradient_seq(x, existing), args.repeats)))
+        done = set()
+        for backend in args.backends:
+            for jobs in args.jobs:
+                resolved = main.resolve_backend(backend, jobs, n, m)
+                if resolved not in POOLED:
+                    jobs = 1
+                if (resolved, jobs) in done:
+                    continue
+                done.add((resolved, jobs))
+                with main.GradientExecutor(existing, jobs, backend, m=m) as ex:
+                    rows.append(_row(name, n, m, "gradient_parallel", ex.backend, jobs,
+                                     _timeit(lambda: ex.gradient(x), args.repeats)))
+                rows.append(_row(name, n, m, "gradient_method", resolved, jobs, _timeit(
+                    lambda: main.gradient_method(existing, x0, max_iter=args.iters, tol=0.0,
+                                                 track_every=args.iters, n_jobs=jobs, backend=backend),
+                    args.method_repeats, warmup=0)))
+        for r in rows:
+            if r["dataset"] == name:
+                print(f"[BENCH][SCALING] {name} {r['kernel']:<17} {r['backend']:<10} "
+                      f"jobs={r['n_jobs']:<2} median {r['median_s'] * 1e3:10.3f} ms "
+                      f"(iqr {r['iqr_s'] * 1e3:.3f})")
+
+    df = _add_speedup(pd.DataFrame(rows))
+    par = df[df["kernel"].isin(["gradient_parallel", "gradient_method"])]
+    print("\n=== Speedup (n_jobs=1 -> n_jobs) ===")
+    print(par.pivot_table(index=["dataset", "kernel", "backend"], columns="n_jobs",
+                          values="speedup", dropna=False).round(2).to_string(na_rep="n/a"))
+
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+        print(f"[BENCH][SCALING] CSV -> {args.csv}")
+    if args.json:
+        meta = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                "numpy": np.__version__, "cpu_count": os.cpu_count(), "machine": platform.machine(),
+                "iters": args.iters, "repeats": args.repeats}
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"meta": meta, "rows": df.to_dict(orient="records")}, fh, indent=1)
+        print(f"[BENCH][SCALING] JSON -> {args.json}")
+
+# =====================================================
+# compare: du scaling JSON failai; lėtesni nei
+# --threshold kartų įrašai pažymimi kaip regresijos
+# =====================================================
+def bench_compare(args) -> None:
+    keys = ["dataset", "n", "m", "kernel", "backend", "n_jobs"]
+    frames = []
+    for path in (args.base, args.new):
+        with open(path, encoding="utf-8") as fh:
+            frames.append(pd.DataFrame(json.load(fh)["rows"]))
+    df = frames[0].merge(frames[1], on=keys, suffixes=("_base", "_new"))
+    df["ratio"] = df["median_s_new"] / df["median_s_base"]
+    df["flag"] = np.where(df["ratio"] > args.threshold, "REGRESSION",
+                          np.where(df["ratio"] < 1 / args.threshold, "faster", ""))
+    cols = keys + ["median_s_base", "median_s_new", "ratio", "flag"]
+    print(df[cols].to_string(index=False))
+    bad = int((df["flag"] == "REGRESSION").sum())
+    print(f"[BENCH][COMPARE] {len(df)} rows, {bad} regressions (> x{args.threshold})")
+    if bad:
+        raise SystemExit(1)
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description="store-placement optimizer benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("solvers", help="iterations and wall time per solver")
+    p.add_argument("--datasets", nargs="*", default=[])
+    p.add_argument("--solvers", nargs="+", default=list(main.SOLVERS), choices=list(main.SOLVERS))
+    p.add_argument("--max-iter", type=int, default=1500)
+    p.add_argument("--tol", type=float, default=1e-6)
+    p.set_defaults(func=bench_solvers)
+
+    p = sub.add_parser("scaling", help="per-kernel timings over n, m, backend and n_jobs")
+    p.add_argument("--datasets", nargs="*", default=[])
+    p.add_argument("--sizes", nargs="*", default=[], help="extra datasets as NxM, e.g. 2000x400")
+    p.add_argument("--backends", nargs="+", default=["vectorized", "threads"],
+                   choices=list(main.BACKENDS))
+    p.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--repeats", type=int, default=20)
+    p.add_argument("--iters", type=int, default=100, help="gradient_method iterations")
+    p.add_argument("--method-repeats", type=int, default=3)
+    p.add_argument("--seq-max-pairs", type=int, default=50_000,
+                   help="skip the loop-based gradient_seq above this m*(n+m)")
+    p.add_argument("--csv", default="")
+    p.add_argument("--json", default="")
+    p.set_defaults(func=bench_scaling)
+
+    p = sub.add_parser("compare", help="compare two scaling JSON files")
+    p.add_argument("base")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=1.10)
+    p.set_defaults(func=bench_compare)
+
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main_cli()
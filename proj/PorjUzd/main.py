@@ -1,3 +1,5 @@
+import os
+
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -9,6 +11,18 @@ rng = np.random.default_rng(7)
 n = 100
 m = 40
 
+# 8 skirtingos apimties duomenų rinkiniai (pavadinimas, n, m)
+DATASETS = [
+    ("S1", 6, 3),
+    ("S2", 20, 10),
+    ("S3", 50, 20),
+    ("S4", 100, 30),
+    ("S5", 100, 40),
+    ("S6", 100, 50),
+    ("S7", 200, 60),
+    ("S8", 200, 70),
+]
+
 # Esamų parduotuvių koordinatės intervale [-10,10]
 existing_xy = rng.uniform(-10.0, 10.0, size=(n, 2))
 
@@ -25,8 +39,9 @@ def Cost_place(p):
     x, y = p
     return (x**4 + y**4) / 1000.0 + (np.sin(x) + np.cos(y)) / 5.0 + 0.4
 
-# Bendra tikslo funkcija F
-def objective(flat_new, existing):
+# Bendra tikslo funkcija F (pradinė versija su Python ciklais;
+# paliekama kaip etalonas objective() patikrai)
+def objective_loop(flat_new, existing):
     P = flat_new.reshape(-1, 2)
 
     # Vietos kainų suma (tik naujoms parduotuvėms)
@@ -43,6 +58,249 @@ def objective(flat_new, existing):
 
     return float(F)
 
+# Vietos kainos vektorizuotai visoms naujoms parduotuvėms
+def place_cost(P):
+    x, y = P[:, 0], P[:, 1]
+    return (x**4 + y**4) / 1000.0 + (np.sin(x) + np.cos(y)) / 5.0 + 0.4
+
+# Vietos kainos gradientas (m, 2)
+def place_grad(P):
+    return np.column_stack((4.0 * P[:, 0] ** 3 / 1000.0 + np.cos(P[:, 0]) / 5.0,
+                            4.0 * P[:, 1] ** 3 / 1000.0 - np.sin(P[:, 1]) / 5.0))
+
+# Bendras atstumų ir eksponenčių skaičiavimas (vienas praėjimas):
+#   D_e (m, n, 2), E_e (m, n) – naujos su esamomis
+#   D_n (m, m, 2), E_n (m, m) – naujos tarpusavyje, įstrižainė = 0
+# Skirtumai skaičiuojami tiesiogiai (broadcasting), o ne per
+# Gram matricą |p|^2 + |q|^2 - 2 p·q, nes pastaroji dėl atimties
+# prarastų tikslumą ir F nebesutaptų su objective_loop iki 1e-12.
+def pair_terms(P, existing):
+    D_e = P[:, None, :] - existing[None, :, :]
+    E_e = np.exp(-0.3 * np.einsum("ijk,ijk->ij", D_e, D_e))
+    D_n = P[:, None, :] - P[None, :, :]
+    E_n = np.exp(-0.3 * np.einsum("ijk,ijk->ij", D_n, D_n))
+    np.fill_diagonal(E_n, 0.0)
+    return D_e, E_e, D_n, E_n
+
+# Vektorizuota tikslo funkcija F (naujų porų j<k suma = viršutinis trikampis)
+def objective(flat_new, existing):
+    P = flat_new.reshape(-1, 2)
+    _, E_e, _, E_n = pair_terms(P, existing)
+    F = np.sum(place_cost(P)) + np.sum(E_e) + np.sum(np.triu(E_n, 1))
+    return float(F)
+
+# F ir gradientas iš to paties atstumų/eksponenčių praėjimo
+def objective_and_grad(flat_new, existing):
+    P = flat_new.reshape(-1, 2)
+    D_e, E_e, D_n, E_n = pair_terms(P, existing)
+    F = np.sum(place_cost(P)) + np.sum(E_e) + np.sum(np.triu(E_n, 1))
+
+    # d/dp_j exp(-0.3||p_j - q||^2) = -0.6 e (p_j - q); naujų porų atveju
+    # simetrinė E_n iškart duoda ir +gpair (j), ir -gpair (k) dalis
+    grad = place_grad(P)
+    grad += -0.6 * np.einsum("ij,ijk->ik", E_e, D_e)
+    grad += -0.6 * np.einsum("ij,ijk->ik", E_n, D_n)
+    return float(F), grad.reshape(-1)
+
+# =====================================================
+# Cutoff režimas (tolimos poros atmetamos)
+# -----------------------------------------------------
+# exp(-0.3 d^2) < eps, kai d > r = sqrt(-ln(eps)/0.3)
+# (eps=1e-12 -> r ~ 9.61), todėl skaičiuojamos tik poros
+# iš kaimynų sąrašų:
+#   - esamos nejuda -> jų UniformGrid statomas 1 kartą
+#   - naujų porų ir naujų-esamų sąrašai statomi spinduliu
+#     r + skin ir naudojami tol, kol nė viena nauja
+#     parduotuvė nepasislinko daugiau nei skin/2 nuo
+#     paskutinio perstatymo (Verlet sąrašas)
+# Atmestos poros F keičia ne daugiau nei eps kiekviena,
+# o gradientą – ne daugiau nei 0.6*r*eps (error_bound()).
+# =====================================================
+def cutoff_radius(eps):
+    return float(np.sqrt(-np.log(eps) / 0.3))
+
+# Tolygus tinklelis: taškai surūšiuoti pagal langelį,
+# starts[c]..starts[c+1] – langelio c taškų indeksai order'yje
+class UniformGrid:
+    def __init__(self, points, cell):
+        self.points = points
+        self.cell = cell
+        ij = np.floor(points / cell).astype(np.int64)
+        self.lo = ij.min(axis=0) if len(points) else np.zeros(2, dtype=np.int64)
+        ij -= self.lo
+        self.shape = (ij.max(axis=0) + 1) if len(points) else np.ones(2, dtype=np.int64)
+        ids = ij[:, 0] * self.shape[1] + ij[:, 1]
+        self.order = np.argsort(ids, kind="stable")
+        counts = np.bincount(ids, minlength=int(self.shape[0] * self.shape[1]))
+        self.starts = np.concatenate(([0], np.cumsum(counts)))
+
+    # Visos poros (qi, pi), kur ||Q[qi] - points[pi]|| <= radius
+    # (radius <= cell, todėl užtenka 3x3 langelių aplink Q tašką)
+    def query_pairs(self, Q, radius):
+        qij = np.floor(Q / self.cell).astype(np.int64) - self.lo
+        qs, ps = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                cx = qij[:, 0] + dx
+                cy = qij[:, 1] + dy
+                ok = (cx >= 0) & (cx < self.shape[0]) & (cy >= 0) & (cy < self.shape[1])
+                q = np.nonzero(ok)[0]
+                c = cx[ok] * self.shape[1] + cy[ok]
+                start, cnt = self.starts[c], self.starts[c + 1] - self.starts[c]
+                # išskleidžiam [start, start+cnt) intervalus į porų masyvus
+                q = np.repeat(q, cnt)
+                offs = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+                qs.append(q)
+                ps.append(self.order[np.repeat(start, cnt) + offs])
+        qi = np.concatenate(qs)
+        pi = np.concatenate(ps)
+        d = Q[qi] - self.points[pi]
+        near = np.einsum("ij,ij->i", d, d) <= radius * radius
+        return qi[near], pi[near]
+
+class CutoffIndex:
+    def __init__(self, existing, eps=1e-12, skin=1.0):
+        self.existing = existing
+        self.eps = eps
+        self.radius = cutoff_radius(eps)
+        self.skin = skin
+        self.grid_e = UniformGrid(existing, self.radius + skin)
+        self.P_ref = None
+        self.rebuilds = 0
+
+    # Grąžina (e_new, e_old, n_a, n_b) sąrašus; perstato tik kai reikia
+    def pairs(self, P):
+        if (self.P_ref is None or len(P) != len(self.P_ref)
+                or np.max(np.sum((P - self.P_ref) ** 2, axis=1)) > (self.skin / 2) ** 2):
+            r_list = self.radius + self.skin
+            self.e_new, self.e_old = self.grid_e.query_pairs(P, r_list)
+            a, b = UniformGrid(P, r_list).query_pairs(P, r_list)
+            keep = a < b
+            self.n_a, self.n_b = a[keep], b[keep]
+            self.P_ref = P.copy()
+            self.rebuilds += 1
+        return self.e_new, self.e_old, self.n_a, self.n_b
+
+    # Viršutinės atmestų porų įtakos ribos: |dF|, max |d grad_i|
+    def error_bound(self, m):
+        n = len(self.existing)
+        f_err = self.eps * (n * m + m * (m - 1) / 2)
+        g_err = 0.6 * self.radius * self.eps * (n + m - 1)
+        return f_err, g_err
+
+# F ir gradientas tik per kaimynų sąrašų poras
+def objective_and_grad_cutoff(flat_new, index):
+    P = flat_new.reshape(-1, 2)
+    m_pts = len(P)
+    e_new, e_old, n_a, n_b = index.pairs(P)
+
+    D_e = P[e_new] - index.existing[e_old]
+    w_e = np.exp(-0.3 * np.einsum("ij,ij->i", D_e, D_e))
+    D_n = P[n_a] - P[n_b]
+    w_n = np.exp(-0.3 * np.einsum("ij,ij->i", D_n, D_n))
+    F = np.sum(place_cost(P)) + np.sum(w_e) + np.sum(w_n)
+
+    grad = place_grad(P)
+    ge = (-0.6 * w_e)[:, None] * D_e
+    gn = (-0.6 * w_n)[:, None] * D_n
+    for c in range(2):
+        grad[:, c] += np.bincount(e_new, weights=ge[:, c], minlength=m_pts)
+        grad[:, c] += np.bincount(n_a, weights=gn[:, c], minlength=m_pts)
+        grad[:, c] -= np.bincount(n_b, weights=gn[:, c], minlength=m_pts)
+    return float(F), grad.reshape(-1)
+
+def objective_cutoff(flat_new, index):
+    return objective_and_grad_cutoff(flat_new, index)[0]
+
+# =====================================================
+# Didelio m režimas: blokinis (tiled) skaičiavimas
+# -----------------------------------------------------
+# objective_and_grad laiko (m, m, 2) tarpinius masyvus, o
+# _grad_chunk kiekvieną naujų porą skaičiuoja du kartus.
+# Čia taškai surūšiuojami Morton (Z) tvarka ir dalinami į
+# TILE dydžio blokus; poros skaičiuojamos blokų poromis
+# (a <= b, kiekviena pora vieną kartą), tarpiniai masyvai –
+# tik (TILE, TILE). Atmintis: O(m + n + TILE^2).
+#
+# eps > 0 – tikslumo tikslas: blokų poros, kurių stačiakampiai
+# (bounding box) toliau nei cutoff_radius(eps), praleidžiamos;
+# kiekviena praleista pora F keičia < eps. eps = 0 – tiksliai.
+# =====================================================
+TILE = 512
+
+def _spread_bits(v):
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
+
+def morton_order(P):
+    lo = P.min(axis=0)
+    span = max(float(np.ptp(P, axis=0).max()), 1e-12)
+    q = ((P - lo) / span * 65535).astype(np.uint32)
+    return np.argsort(_spread_bits(q[:, 0]) | (_spread_bits(q[:, 1]) << 1), kind="stable")
+
+def _tile_boxes(Q, tile):
+    starts = np.arange(0, len(Q), tile)
+    lo = np.minimum.reduceat(Q, starts, axis=0)
+    hi = np.maximum.reduceat(Q, starts, axis=0)
+    return starts, lo, hi
+
+def _box_gap2(lo_a, hi_a, lo_b, hi_b):
+    gap = np.maximum(0.0, np.maximum(lo_b - hi_a, lo_a - hi_b))
+    return float(np.dot(gap, gap))
+
+# Blokų poros (A, B) exp(-0.3 d^2) matrica
+def _tile_weights(A, B):
+    dx = A[:, 0, None] - B[None, :, 0]
+    dy = A[:, 1, None] - B[None, :, 1]
+    return np.exp(-0.3 * (dx * dx + dy * dy))
+
+def objective_and_grad_tiled(flat_new, existing, tile=TILE, eps=0.0):
+    P = flat_new.reshape(-1, 2)
+    order = morton_order(P)
+    Q = P[order]
+    E = existing[morton_order(existing)] if len(existing) else existing
+    r2 = cutoff_radius(eps) ** 2 if eps > 0 else np.inf
+
+    F = float(np.sum(place_cost(Q)))
+    G = place_grad(Q)
+    sq, lo_q, hi_q = _tile_boxes(Q, tile)
+
+    # Naujos su esamomis
+    if len(E):
+        se, lo_e, hi_e = _tile_boxes(E, tile)
+        for a, qa in enumerate(sq):
+            A = Q[qa:qa + tile]
+            for b, eb in enumerate(se):
+                if _box_gap2(lo_q[a], hi_q[a], lo_e[b], hi_e[b]) > r2:
+                    continue
+                B = E[eb:eb + tile]
+                W = _tile_weights(A, B)
+                F += float(W.sum())
+                G[qa:qa + tile] += -0.6 * (W.sum(axis=1)[:, None] * A - W @ B)
+
+    # Naujos tarpusavyje: tik a <= b, bloke a == b – viršutinis trikampis
+    for a, qa in enumerate(sq):
+        A = Q[qa:qa + tile]
+        for b in range(a, len(sq)):
+            if _box_gap2(lo_q[a], hi_q[a], lo_q[b], hi_q[b]) > r2:
+                continue
+            qb = sq[b]
+            B = Q[qb:qb + tile]
+            W = _tile_weights(A, B)
+            if a == b:
+                W = np.triu(W, 1)
+            F += float(W.sum())
+            # gpair_jk = -0.6 W_jk (q_j - q_k): +j eilutėms, -k stulpeliams
+            G[qa:qa + tile] += -0.6 * (W.sum(axis=1)[:, None] * A - W @ B)
+            G[qb:qb + tile] -= -0.6 * (W.T @ A - W.sum(axis=0)[:, None] * B)
+
+    grad = np.empty_like(G)
+    grad[order] = G
+    return F, grad.reshape(-1)
+
 # Nuosekli gradiento versija (kryptis, kur F dideja)
 def gradient_seq(flat_new, existing):
     P = flat_new.reshape(-1, 2)
@@ -73,118 +331,775 @@ def gradient_seq(flat_new, existing):
 
     return grad.reshape(-1)
 
+# =====================================================
 # Lygiagretus gradientas
-def gradient_parallel(flat_new, existing, n_jobs=1):
-    # Jei prašoma tik 1 gija – naudojam paprastą nuoseklią versiją
-    if n_jobs == 1:
-        return gradient_seq(flat_new, existing)
+# -----------------------------------------------------
+# Naujos parduotuvės padalinamos į n_jobs ištisinių
+# gabalų (po vieną worker'iui); kiekvienas gabalas
+# skaičiuojamas vektorizuotai (_grad_chunk) ir grąžina savo
+# F dalį bei gradiento eilutes, todėl F ir gradientas – iš
+# to paties lygiagretaus praėjimo (objective_and_grad()).
+#
+# GradientExecutor laiko joblib pool'ą visą optimizavimą:
+#   - "threads":    gijos (numpy atleidžia GIL dideliems masyvams)
+#   - "loky":       procesai; existing perduodamas per joblib
+#                   memmap (max_nbytes=0), t.y. bendra atmintis
+#   - "vectorized": be pool'o, objective_and_grad vienoje gijoje
+#   - "tiled":      be pool'o, objective_and_grad_tiled (didelis m)
+#   - "auto":       "tiled", kai m >= AUTO_TILED_M; "vectorized",
+#                   kai n_jobs == 1 arba porų m*(n+m) < AUTO_THREADS_MIN;
+#                   kitaip "threads"
+# =====================================================
+BACKENDS = ("auto", "vectorized", "tiled", "threads", "loky")
+AUTO_THREADS_MIN = 200_000
+AUTO_TILED_M = 2000
+
+# F dalis ir gradiento eilutės naujoms parduotuvėms lo..hi-1
+def _grad_chunk(P, existing, lo, hi):
+    Pj = P[lo:hi]
+    g = place_grad(Pj)
 
-    P = flat_new.reshape(-1, 2)
-    m_pts = len(P)
-
-    #kiekvienai parduotuvei atskirai skaiciuoja gradienta
-    def grad_for_j(j):
-        p_j = P[j]
-
-        # Vietos kainos Cost_place išvestinės
-        gx = 4.0 * p_j[0] ** 3 / 1000.0 + np.cos(p_j[0]) / 5.0
-        gy = 4.0 * p_j[1] ** 3 / 1000.0 - np.sin(p_j[1]) / 5.0
-        g = np.array([gx, gy], dtype=float)
-
-        # Porinės kainos su esamomis parduotuvėmis
-        diffs_e = p_j - existing
-        d2_e = np.sum(diffs_e ** 2, axis=1)
-        e_e = np.exp(-0.3 * d2_e)
-        g += np.sum(((-0.6) * e_e)[:, None] * diffs_e, axis=0)
-
-        # Porinės kainos su kitomis naujomis parduotuvėmis
-        diffs_n = p_j - P
-        d2_n = np.sum(diffs_n ** 2, axis=1)
-        e_n = np.exp(-0.3 * d2_n)
-        g += np.sum(((-0.6) * e_n)[:, None] * diffs_n, axis=0)
+    # Porinės kainos su esamomis parduotuvėmis
+    D_e = Pj[:, None, :] - existing[None, :, :]
+    E_e = np.exp(-0.3 * np.einsum("ijk,ijk->ij", D_e, D_e))
+    g += -0.6 * np.einsum("ij,ijk->ik", E_e, D_e)
+
+    # Porinės kainos su kitomis naujomis (j == k duoda diff = 0)
+    D_n = Pj[:, None, :] - P[None, :, :]
+    E_n = np.exp(-0.3 * np.einsum("ijk,ijk->ij", D_n, D_n))
+    g += -0.6 * np.einsum("ij,ijk->ik", E_n, D_n)
+
+    # F dalis: eilutės j poros su k > j (triu poslinkis lo + 1),
+    # todėl kiekviena naujų pora gabaluose įskaitoma 1 kartą
+    F = np.sum(place_cost(Pj)) + np.sum(E_e) + np.sum(np.triu(E_n, lo + 1))
+    return F, g
+
+def resolve_backend(backend, n_jobs, n, m):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r} (expected one of {BACKENDS})")
+    if backend == "auto":
+        if m >= AUTO_TILED_M:
+            return "tiled"
+        if n_jobs == 1 or m * (n + m) < AUTO_THREADS_MIN:
+            return "vectorized"
+        return "threads"
+    return backend
+
+class GradientExecutor:
+    def __init__(self, existing, n_jobs=1, backend="auto", m=None):
+        self.existing = existing
+        self.n_jobs = n_jobs
+        self.backend = resolve_backend(backend, n_jobs, len(existing), m or 0)
+        self.parallel = None
+
+    def __enter__(self):
+        if self.backend == "threads":
+            self.parallel = Parallel(n_jobs=self.n_jobs, prefer="threads")
+        elif self.backend == "loky":
+            self.parallel = Parallel(n_jobs=self.n_jobs, backend="loky",
+                                     max_nbytes=0, mmap_mode="r")
+        if self.parallel is not None:
+            self.parallel.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.parallel is not None:
+            self.parallel.__exit__(*exc)
+            self.parallel = None
+
+    def objective_and_grad(self, flat_new):
+        P = flat_new.reshape(-1, 2)
+        if self.backend == "tiled":
+            return objective_and_grad_tiled(flat_new, self.existing)
+        if self.parallel is None:
+            return objective_and_grad(flat_new, self.existing)
+        bounds = np.linspace(0, len(P), min(self.n_jobs, len(P)) + 1).astype(int)
+        parts = self.parallel(
+            delayed(_grad_chunk)(P, self.existing, lo, hi)
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        )
+        return float(sum(F for F, _ in parts)), np.vstack([g for _, g in parts]).reshape(-1)
 
-        return g
+    def gradient(self, flat_new):
+        return self.objective_and_grad(flat_new)[1]
 
-    grads = Parallel(n_jobs=n_jobs, prefer="threads")(
-        delayed(grad_for_j)(j) for j in range(m_pts)
-    )
+def gradient_parallel(flat_new, existing, n_jobs=1, backend="threads", executor=None):
+    # Jei prašoma tik 1 gija – naudojam paprastą nuoseklią versiją
+    if executor is None and n_jobs == 1:
+        return gradient_seq(flat_new, existing)
+    if executor is not None:
+        return executor.gradient(flat_new)
 
-    grad_arr = np.vstack(grads)
-    return grad_arr.reshape(-1)
+    # vienkartinis kvietimas: pool'as tik šiam gradientui
+    with GradientExecutor(existing, n_jobs, backend, m=flat_new.size // 2) as ex:
+        return ex.gradient(flat_new)
 
 # Naudojama tik patikrai, ne optimizacijai
-# letesnis, beveik visada teisingas, naudojamas tik gradiento tikrinimui
-# koordinate pakeicia eps ir vel skaiciuoja F
+# koordinate pakeicia eps ir vel skaiciuoja F; visi 2m pakeisti
+# taškai skaičiuojami batch'ais per objective_batch
 def numeric_grad(flat_new, existing, eps=1e-6):
-    g = np.zeros_like(flat_new)
+    X = np.tile(flat_new, (len(flat_new), 1))
+    X[np.arange(len(flat_new)), np.arange(len(flat_new))] += eps
     f0 = objective(flat_new, existing)
-    for i in range(len(flat_new)):
-        x_pert = flat_new.copy()
-        x_pert[i] += eps
-        g[i] = (objective(x_pert, existing) - f0) / eps
-    return g
+    return (objective_batch(X.reshape(len(flat_new), -1, 2), existing) - f0) / eps
+
+# Greitas gradiento patikrinimas:
+#   "directional" – n_dirs atsitiktinių krypčių u: g·u palyginamas su
+#                   (F(x+hu) - F(x-hu)) / 2h (2*n_dirs F skaičiavimų)
+#   "full"        – centriniai skirtumai visoms 2m koordinatėms
+#                   (4m F skaičiavimų batch'ais)
+#   "complex"     – complex-step: Im F(x + i h u) / h, be atimties,
+#                   todėl tikslu iki mašininio tikslumo (n_dirs F skaič.);
+#                   žingsnis – h_complex (h naudojamas tik skirtumams)
+# Grąžina {"max_abs_err", "max_rel_err", "evals"}; rel. paklaida
+# skaičiuojama nuo max(|tikslas|, 1).
+def check_gradient(grad, flat_new, existing, mode="directional", n_dirs=8, h=1e-5, seed=0,
+                   h_complex=1e-20):
+    g = grad(flat_new, existing) if callable(grad) else np.asarray(grad)
+    if mode in ("directional", "complex"):
+        U = np.random.default_rng(seed).standard_normal((n_dirs, flat_new.size))
+        U /= np.linalg.norm(U, axis=1, keepdims=True)
+        want = U @ g
+    elif mode == "full":
+        U = np.eye(flat_new.size)
+        want = g
+    else:
+        raise ValueError(f"Unknown mode {mode!r} (expected 'directional', 'full' or 'complex')")
+
+    if mode == "complex":
+        X = (flat_new + 1j * h_complex * U).reshape(len(U), -1, 2)
+        got = objective_batch(X, existing).imag / h_complex
+    else:
+        X = np.concatenate((flat_new + h * U, flat_new - h * U)).reshape(2 * len(U), -1, 2)
+        F = objective_batch(X, existing)
+        got = (F[:len(U)] - F[len(U):]) / (2 * h)
+    err = np.abs(got - want)
+    return {"max_abs_err": float(err.max()),
+            "max_rel_err": float(np.max(err / np.maximum(np.abs(want), 1.0))),
+            "evals": len(X)}
 
 # Gradientinis metodas
+# =====================================================
+# Žingsnio taisyklės (solver'iai) gradient_method'ui
+# -----------------------------------------------------
+# update(x, f, g, vg, fval) -> (x_new, f_new, g_new, step)
+# arba None, jei žingsnio rasti nepavyko; vg(x) -> (F, grad),
+# fval(x) -> F (pigesnis, line search'ui).
+#   fixed     – x - step*g (pradinis metodas; F padidėjus stabdom)
+#   armijo    – backtracking, kol F(x - t g) <= F - c t ||g||^2
+#   bb        – Barzilai–Borwein žingsnis s·s / s·y (nemonotoninis)
+#   nesterov  – momentas (PyTorch forma, vienas gradientas
+#               iteracijai) su restart'u, kai F padidėja
+#   adam      – Adam (step = mokymosi greitis)
+#   lbfgs     – L-BFGS kryptis + Armijo backtracking
+# =====================================================
+ARMIJO_C = 1e-4
+MIN_STEP = 1e-12
+
+class FixedStep:
+    guard_increase = True
+
+    def __init__(self, step=0.01):
+        self.step = step
+
+    def update(self, x, f, g, vg, fval):
+        x_new = x - self.step * g
+        f_new, g_new = vg(x_new)
+        return x_new, f_new, g_new, self.step
+
+def _backtrack(x, f, g, d, t, fval):
+    # Armijo sąlyga krypčiai d (g·d < 0)
+    slope = float(np.dot(g, d))
+    while t >= MIN_STEP:
+        if fval(x + t * d) <= f + ARMIJO_C * t * slope:
+            return t
+        t *= 0.5
+    return None
+
+class Armijo:
+    guard_increase = False
+
+    def __init__(self, step=0.01, grow=2.0):
+        self.t = step
+        self.grow = grow
+
+    def update(self, x, f, g, vg, fval):
+        # pradedam nuo praeito priimto žingsnio * grow
+        t = _backtrack(x, f, g, -g, self.t * self.grow, fval)
+        if t is None:
+            return None
+        self.t = t
+        x_new = x - t * g
+        f_new, g_new = vg(x_new)
+        return x_new, f_new, g_new, t
+
+class BarzilaiBorwein:
+    guard_increase = False
+
+    def __init__(self, step=0.01, min_step=1e-8, max_step=1e3):
+        self.step = step
+        self.t = step
+        self.min_step = min_step
+        self.max_step = max_step
+
+    def update(self, x, f, g, vg, fval):
+        x_new = x - self.t * g
+        f_new, g_new = vg(x_new)
+        t_used = self.t
+        s = x_new - x
+        y = g_new - g
+        sy = float(np.dot(s, y))
+        # neigiamas kreivumas -> grįžtam prie pradinio žingsnio
+        self.t = float(np.clip(np.dot(s, s) / sy, self.min_step, self.max_step)) if sy > 0 else self.step
+        return x_new, f_new, g_new, t_used
+
+class Nesterov:
+    guard_increase = False
+
+    def __init__(self, step=0.01, momentum=0.9):
+        self.step = step
+        self.mu = momentum
+        self.v = None
+
+    def update(self, x, f, g, vg, fval):
+        if self.v is None:
+            self.v = np.zeros_like(x)
+        self.v = self.mu * self.v + g
+        x_new = x - self.step * (g + self.mu * self.v)
+        f_new, g_new = vg(x_new)
+        if f_new > f:
+            self.v[:] = 0.0  # adaptive restart
+        return x_new, f_new, g_new, self.step
+
+class Adam:
+    guard_increase = False
+
+    def __init__(self, step=0.05, beta1=0.9, beta2=0.999, eps=1e-8):
+        self.step = step
+        self.b1, self.b2, self.eps = beta1, beta2, eps
+        self.m1 = self.m2 = None
+        self.k = 0
+
+    def update(self, x, f, g, vg, fval):
+        if self.m1 is None:
+            self.m1 = np.zeros_like(x)
+            self.m2 = np.zeros_like(x)
+        self.k += 1
+        self.m1 = self.b1 * self.m1 + (1 - self.b1) * g
+        self.m2 = self.b2 * self.m2 + (1 - self.b2) * g * g
+        m_hat = self.m1 / (1 - self.b1 ** self.k)
+        v_hat = self.m2 / (1 - self.b2 ** self.k)
+        x_new = x - self.step * m_hat / (np.sqrt(v_hat) + self.eps)
+        f_new, g_new = vg(x_new)
+        return x_new, f_new, g_new, self.step
+
+class LBFGS:
+    guard_increase = False
+
+    def __init__(self, step=0.01, memory=10):
+        self.step = step
+        self.memory = memory
+        self.S, self.Y = [], []
+
+    def _direction(self, g):
+        # two-loop rekursija: d = -H g
+        q = g.copy()
+        alphas = []
+        for s, y in zip(reversed(self.S), reversed(self.Y)):
+            a = np.dot(s, q) / np.dot(s, y)
+            q -= a * y
+            alphas.append(a)
+        if self.S:
+            q *= np.dot(self.S[-1], self.Y[-1]) / np.dot(self.Y[-1], self.Y[-1])
+        else:
+            q *= self.step
+        for (s, y), a in zip(zip(self.S, self.Y), reversed(alphas)):
+            b = np.dot(y, q) / np.dot(s, y)
+            q += (a - b) * s
+        return -q
+
+    def update(self, x, f, g, vg, fval):
+        d = self._direction(g)
+        if np.dot(g, d) >= 0:
+            # ne nusileidimo kryptis -> atmetam istoriją
+            self.S, self.Y = [], []
+            d = -self.step * g
+        t = _backtrack(x, f, g, d, 1.0, fval)
+        if t is None:
+            return None
+        x_new = x + t * d
+        f_new, g_new = vg(x_new)
+        s, y = x_new - x, g_new - g
+        if np.dot(s, y) > 1e-12:
+            self.S.append(s)
+            self.Y.append(y)
+            if len(self.S) > self.memory:
+                self.S.pop(0)
+                self.Y.pop(0)
+        return x_new, f_new, g_new, t
+
+SOLVERS = {
+    "fixed": FixedStep,
+    "armijo": Armijo,
+    "bb": BarzilaiBorwein,
+    "nesterov": Nesterov,
+    "adam": Adam,
+    "lbfgs": LBFGS,
+}
+
+def make_solver(solver, step, solver_opts=None):
+    if not isinstance(solver, str):
+        return solver
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver {solver!r} (expected one of {tuple(SOLVERS)})")
+    return SOLVERS[solver](step=step, **(solver_opts or {}))
+
+# =====================================================
+# Trajektorijos ir istorijos įrašymas
+# -----------------------------------------------------
+# gradient_method kviečia recorder'io metodus:
+#   open(x0, max_frames) – prieš ciklą
+#   record(it, x, f, step, gnorm) – pirmas kvietimas pradžiai, toliau
+#                                   kas track_every iteracijų
+#   finish(entry, x) – sustabdymo įrašas (dict)
+#   close(); result() -> (hist, paths)
+#
+# ListRecorder – pradinis formatas: paths – m sąrašų su
+# taškų kopijomis, hist – dict'ų sąrašas.
+#
+# TrajectoryRecorder – kompaktiškas:
+#   traj (frames, m, 2) float32 – iš anksto išskirtas; jei
+#   capacity mažesnis už max_frames, tai žiedas (lieka
+#   paskutiniai capacity kadrų);
+#   hist (frames,) struktūrinis masyvas HIST_DTYPE;
+#   path="traj.npy" – abu masyvai yra .npy memmap'ai diske
+#   (hist – "traj.hist.npy"), close() apkarpo juos iki
+#   įrašytų kadrų, o apsisukusį žiedą (capacity) perrašo
+#   chronologine tvarka, todėl failus galima skaityti np.load.
+# result(): hist – [sustabdymo dict], paths – (m, kadrai, 2)
+# masyvas (iteruojant gaunamos atskirų parduotuvių trajektorijos).
+# =====================================================
+HIST_DTYPE = np.dtype([("iter", np.int64), ("f", np.float64),
+                       ("step", np.float64), ("gnorm", np.float64)])
+
+class ListRecorder:
+    def open(self, x0, max_frames):
+        m_pts = x0.size // 2
+        self.paths = [[x0[2 * j:2 * j + 2].copy()] for j in range(m_pts)]
+        self.hist = []
+        self.started = False
+
+    def record(self, it, x, f, step, gnorm):
+        if not self.started:
+            self.started = True
+            return  # pradinis taškas jau paths'e
+        for j in range(len(self.paths)):
+            self.paths[j].append(x[2 * j:2 * j + 2].copy())
+        self.hist.append({"iter": it, "f": f, "step": step, "gnorm": gnorm})
+
+    def finish(self, entry, x):
+        self.hist.append(entry)
+
+    def close(self):
+        pass
+
+    def result(self):
+        return self.hist, self.paths
+
+# .npy failo pirmą matmenį sumažina iki count ir nukerpa uodegą
+# (antraštė perrašoma ta pačia apimtimi, užpildant tarpais)
+def _shrink_npy(path, count):
+    with open(path, "r+b") as fh:
+        major, _ = np.lib.format.read_magic(fh)
+        read = np.lib.format.read_array_header_1_0 if major == 1 else np.lib.format.read_array_header_2_0
+        shape, fortran, dtype = read(fh)
+        offset = fh.tell()
+        prefix = 10 if major == 1 else 12
+        shape = (count,) + tuple(shape[1:])
+        text = repr({"descr": np.lib.format.dtype_to_descr(dtype),
+                     "fortran_order": fortran, "shape": shape})
+        fh.seek(prefix)
+        fh.write((text.ljust(offset - prefix - 1) + "\n").encode("latin1"))
+        fh.truncate(offset + count * int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize)
+
+class TrajectoryRecorder:
+    def __init__(self, path=None, capacity=None, dtype=np.float32):
+        self.path = path
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.summary = None
+
+    def open(self, x0, max_frames):
+        m_pts = x0.size // 2
+        frames = min(self.capacity, max_frames) if self.capacity else max_frames
+        if self.path:
+            self.hist_path = self.path[:-4] + ".hist.npy" if self.path.endswith(".npy") else self.path + ".hist.npy"
+            self.traj = np.lib.format.open_memmap(self.path, mode="w+", dtype=self.dtype, shape=(frames, m_pts, 2))
+            self.hist = np.lib.format.open_memmap(self.hist_path, mode="w+", dtype=HIST_DTYPE, shape=(frames,))
+        else:
+            self.traj = np.empty((frames, m_pts, 2), dtype=self.dtype)
+            self.hist = np.empty(frames, dtype=HIST_DTYPE)
+        self.count = 0
+        self.last_it = None
+
+    def record(self, it, x, f, step, gnorm):
+        slot = self.count % len(self.traj)
+        self.traj[slot] = x.reshape(-1, 2)
+        self.hist[slot] = (it, f, step, gnorm)
+        self.count += 1
+        self.last_it = it
+
+    def finish(self, entry, x):
+        self.summary = entry
+        # galutinė padėtis, jei ji dar neįrašyta (track_every > 1)
+        last = (self.count - 1) % len(self.traj)
+        if self.count == 0 or not np.array_equal(self.traj[last], x.reshape(-1, 2).astype(self.dtype)):
+            self.record(entry["iter"], x, entry["f"], entry["step"], entry["gnorm"])
+
+    def close(self):
+        if self.path and isinstance(self.traj, np.memmap):
+            n_frames = min(self.count, len(self.traj))
+            if self.count > n_frames:
+                # žiedas apsisuko: faile kadrai turi būti chronologine tvarka
+                order = self._order()
+                self.traj[:] = self.traj[order]
+                self.hist[:] = self.hist[order]
+                self.count = n_frames
+            self.traj.flush()
+            self.hist.flush()
+            del self.traj, self.hist
+            _shrink_npy(self.path, n_frames)
+            _shrink_npy(self.hist_path, n_frames)
+            self.traj = np.load(self.path, mmap_mode="r")
+            self.hist = np.load(self.hist_path, mmap_mode="r")
+
+    def _order(self):
+        n_frames = len(self.traj)
+        if self.count <= n_frames:
+            return np.arange(self.count)
+        return np.arange(self.count - n_frames, self.count) % n_frames
+
+    # chronologine tvarka: (kadrai, m, 2) ir (kadrai,) HIST_DTYPE
+    def trajectory(self):
+        return self.traj[self._order()] if self.count > len(self.traj) else self.traj[:self.count]
+
+    def history(self):
+        return self.hist[self._order()] if self.count > len(self.hist) else self.hist[:self.count]
+
+    def result(self):
+        return [self.summary], self.trajectory().swapaxes(0, 1)
+
+# =====================================================
+# Checkpoint'ai (gradient_method(checkpoint=..., resume=...))
+# -----------------------------------------------------
+# .npz failas: x, f, iter, nfev/ngev, solver pavadinimas,
+# stop (tuščias, jei nebaigta) ir solver'io būsena:
+#   s_<vardas> – masyvai ir skaičiai (pvz. Adam m1/m2/k),
+#   l_<vardas> – masyvų sąrašai (L-BFGS S/Y) kaip 2D masyvas;
+# None laukai neišsaugomi (lieka pradinės reikšmės).
+# Rašoma į laikiną failą ir os.replace – nutrūkus rašymui
+# senas checkpoint'as lieka sveikas.
+# =====================================================
+def solver_name(upd):
+    for name, cls in SOLVERS.items():
+        if type(upd) is cls:
+            return name
+    return type(upd).__name__
+
+def save_checkpoint(path, x, f, it, upd, counts, stop=""):
+    data = {"x": x, "f": f, "iter": it, "nfev": counts["nfev"], "ngev": counts["ngev"],
+            "solver": solver_name(upd), "stop": stop}
+    for key, val in vars(upd).items():
+        if isinstance(val, list):
+            data["l_" + key] = np.array(val).reshape(len(val), -1) if val else np.empty((0, 0))
+        elif val is not None:
+            data["s_" + key] = val
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **data)
+    os.replace(tmp, path)
+
+def load_checkpoint(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+def _restore_solver(upd, ckpt):
+    if str(ckpt["solver"]) != solver_name(upd):
+        raise ValueError(f"Checkpoint solver {str(ckpt['solver'])!r} != {solver_name(upd)!r}")
+    for key, val in ckpt.items():
+        if key.startswith("s_"):
+            setattr(upd, key[2:], val.item() if val.ndim == 0 else val.copy())
+        elif key.startswith("l_"):
+            setattr(upd, key[2:], [row.copy() for row in val])
+
+# cutoff:  None – visos poros; skaičius – eps cutoff režimui (pvz. 1e-12),
+#          tada naudojamas CutoffIndex, o n_jobs ignoruojamas
+# backend: žr. GradientExecutor (pool'as sukuriamas 1 kartą visam metodui)
+# tile_eps: "tiled" backend'o tikslumo tikslas (0 – tiksliai)
+# solver:  SOLVERS raktas arba objektas su update(); step – jo (pradinis) žingsnis
+# recorder: None – ListRecorder (pradinis formatas), arba TrajectoryRecorder
+# checkpoint: .npz kelias; būsena rašoma kas checkpoint_every priimtų
+#          iteracijų ir pabaigoje; resume: checkpoint'as, nuo kurio tęsti
+#          (x0 tada ignoruojamas, iteracijų skaičius tęsiamas iki max_iter)
+# Paskutinis hist įrašas turi "nfev"/"ngev" – F ir gradiento skaičiavimų kiekį
 def gradient_method(existing, x0, max_iter=2000, tol=1e-6,
-                    step=0.01, track_every=1, n_jobs=1):
-    x = x0.reshape(-1).astype(float)
+                    step=0.01, track_every=1, n_jobs=1, cutoff=None, backend="auto",
+                    solver="fixed", solver_opts=None, tile_eps=0.0, recorder=None,
+                    checkpoint=None, checkpoint_every=100, resume=None):
+    ckpt = load_checkpoint(resume) if resume is not None else None
+    x = (ckpt["x"] if ckpt is not None else x0.reshape(-1)).astype(float)
     m = x.size // 2
+    it0 = int(ckpt["iter"]) if ckpt is not None else 0
+
+    # Trajektorijos kaupimas: pradinis taškas + kas track_every priimtų žingsnių
+    # (track_every kartotiniai intervale (it0, max_iter]) + stop įrašas
+    rec = recorder if recorder is not None else ListRecorder()
+    rec.open(x, max(0, max_iter // track_every - it0 // track_every) + 2)
+
+    # "vectorized" backend'as ir cutoff: F ir gradientas iš vieno praėjimo,
+    # kitaip – objective + executor.gradient
+    executor = GradientExecutor(existing, n_jobs, backend, m=m)
+    if cutoff is not None:
+        index = CutoffIndex(existing, eps=cutoff)
+        f_only = lambda v: objective_cutoff(v, index)
+        f_and_g = lambda v: objective_and_grad_cutoff(v, index)
+    elif executor.backend == "vectorized":
+        f_only = lambda v: objective(v, existing)
+        f_and_g = lambda v: objective_and_grad(v, existing)
+    elif executor.backend == "tiled":
+        f_only = lambda v: objective_and_grad_tiled(v, existing, eps=tile_eps)[0]
+        f_and_g = lambda v: objective_and_grad_tiled(v, existing, eps=tile_eps)
+    else:
+        f_only = lambda v: objective(v, existing)
+        f_and_g = executor.objective_and_grad
+
+    counts = {"nfev": 0, "ngev": 0}
+    if ckpt is not None:
+        counts = {"nfev": int(ckpt["nfev"]), "ngev": int(ckpt["ngev"])}
+
+    def fval(v):
+        counts["nfev"] += 1
+        return f_only(v)
+
+    def vg(v):
+        counts["nfev"] += 1
+        counts["ngev"] += 1
+        return f_and_g(v)
+
+    upd = make_solver(solver, step, solver_opts)
+    if ckpt is not None:
+        _restore_solver(upd, ckpt)
+
+    t = step
+    with executor:
+        # tęsiant x gradientas jau įskaitytas checkpoint'o nfev/ngev
+        f, g = f_and_g(x) if ckpt is not None else vg(x)
+        rec.record(it0, x, f, 0.0, float(np.linalg.norm(g)))
+        for it in range(it0 + 1, max_iter + 1):
+            gnorm = float(np.linalg.norm(g))
+
+            # Sustabdymas pagal mažą gradiento normą
+            if gnorm < tol:
+                rec.finish({"iter": it, "f": f, "step": 0.0,
+                            "gnorm": gnorm, "stop": "||grad||<tol"}, x)
+                break
+
+            # Vienas žingsnis pagal pasirinktą taisyklę
+            res = upd.update(x, f, g, vg, fval)
+            if res is None:
+                rec.finish({"iter": it, "f": f, "step": 0.0,
+                            "gnorm": gnorm, "stop": "žingsnis per mažas"}, x)
+                break
+            x_new, f_new, g_new, t = res
+
+            # Paprasta apsauga: jei F padidėjo labai ryškiai, stabdom (nenorim „iššokti“)
+            if upd.guard_increase and f_new > f and f_new - f > 1e-6:
+                rec.finish({"iter": it, "f": f, "step": t,
+                            "gnorm": gnorm, "stop": "F padidėjo"}, x)
+                break
+
+            # Patvirtiname žingsnį
+            x = x_new
+            f = f_new
+            g = g_new
+
+            # Užfiksuojame trajektorijų taškus ir istoriją
+            if it % track_every == 0:
+                rec.record(it, x, f, t, gnorm)
+            if checkpoint is not None and it % checkpoint_every == 0:
+                save_checkpoint(checkpoint, x, f, it, upd, counts)
+
+        else:
+            # pasiekta max_iter
+            rec.finish({"iter": max_iter, "f": f, "step": t,
+                        "gnorm": float(np.linalg.norm(g)),
+                        "stop": "max_iter"}, x)
+
+    rec.close()
+    hist, paths = rec.result()
+    hist[-1].update(counts)
+    if checkpoint is not None:
+        # "iter" – paskutinė priimta iteracija (stop įraše – sekanti)
+        last = hist[-1]["iter"] if hist[-1]["stop"] == "max_iter" else hist[-1]["iter"] - 1
+        save_checkpoint(checkpoint, x, f, max(last, it0), upd, counts, hist[-1]["stop"])
+    if cutoff is not None:
+        hist[-1]["cutoff_err"] = index.error_bound(m)
+        hist[-1]["rebuilds"] = index.rebuilds
 
-    # Trajektorijos kaupimas: kiekvienai naujai parduotuvei saugom visi priimti taškai
-    paths = [[x[2 * j:2 * j + 2].copy()] for j in range(m)]
-    hist = []
+    return x, hist, paths
 
-    f = objective(x, existing)
+# =====================================================
+# Multi-start: K pradinių išdėstymų optimizuojami kartu
+# -----------------------------------------------------
+# X (K, m, 2) – visi kandidatai; kiekvienoje iteracijoje
+# F ir gradientas skaičiuojami vienu batch'u tik dar
+# aktyviems kandidatams. Kiekvienas kandidatas turi savo
+# sustabdymo priežastį (tos pačios kaip gradient_method):
+#   "||grad||<tol", "F padidėjo", "max_iter"
+# n_jobs > 1: kandidatai padalinami į gabalus, kurie
+# optimizuojami lygiagrečiai (joblib gijos).
+# =====================================================
+def objective_and_grad_batch(X, existing):
+    # X (K, m, 2) -> F (K,), grad (K, m, 2)
+    D_e = X[:, :, None, :] - existing[None, None, :, :]
+    E_e = np.exp(-0.3 * np.einsum("kijc,kijc->kij", D_e, D_e))
+    D_n = X[:, :, None, :] - X[:, None, :, :]
+    E_n = np.exp(-0.3 * np.einsum("kijc,kijc->kij", D_n, D_n))
+    idx = np.arange(X.shape[1])
+    E_n[:, idx, idx] = 0.0
+
+    place = (X[..., 0] ** 4 + X[..., 1] ** 4) / 1000.0 + (np.sin(X[..., 0]) + np.cos(X[..., 1])) / 5.0 + 0.4
+    # E_n simetrinė -> kiekviena pora j<k lygiai pusė visos sumos
+    F = place.sum(axis=1) + E_e.sum(axis=(1, 2)) + 0.5 * E_n.sum(axis=(1, 2))
+
+    grad = np.stack((4.0 * X[..., 0] ** 3 / 1000.0 + np.cos(X[..., 0]) / 5.0,
+                     4.0 * X[..., 1] ** 3 / 1000.0 - np.sin(X[..., 1]) / 5.0), axis=-1)
+    grad += -0.6 * np.einsum("kij,kijc->kic", E_e, D_e)
+    grad += -0.6 * np.einsum("kij,kijc->kic", E_n, D_n)
+    return F, grad
+
+# Tik F (K,) – be gradiento; K dalijamas į gabalus, kad tarpiniai
+# masyvai neviršytų ~BATCH_PAIRS porų
+BATCH_PAIRS = 2_000_000
+
+def objective_batch(X, existing):
+    K, m_pts, _ = X.shape
+    step_k = max(1, BATCH_PAIRS // max(1, m_pts * (len(existing) + m_pts)))
+    out = np.empty(K, dtype=X.dtype)  # complex X -> complex-step (check_gradient)
+    iu = np.triu_indices(m_pts, 1)
+    for lo in range(0, K, step_k):
+        Xk = X[lo:lo + step_k]
+        D_e = Xk[:, :, None, :] - existing[None, None, :, :]
+        D_n = Xk[:, :, None, :] - Xk[:, None, :, :]
+        d2_n = np.einsum("kijc,kijc->kij", D_n, D_n)[:, iu[0], iu[1]]
+        place = ((Xk[..., 0] ** 4 + Xk[..., 1] ** 4) / 1000.0
+                 + (np.sin(Xk[..., 0]) + np.cos(Xk[..., 1])) / 5.0 + 0.4)
+        out[lo:lo + step_k] = (place.sum(axis=1)
+                               + np.exp(-0.3 * np.einsum("kijc,kijc->kij", D_e, D_e)).sum(axis=(1, 2))
+                               + np.exp(-0.3 * d2_n).sum(axis=1))
+    return out
+
+def _multi_start_batch(existing, X0, max_iter, tol, step):
+    X = X0.astype(float).copy()
+    K = len(X)
+    f, g = objective_and_grad_batch(X, existing)
+    f0 = f.copy()
+    iters = np.zeros(K, dtype=int)
+    gnorm = np.zeros(K)
+    stop = np.array(["max_iter"] * K, dtype=object)
+    active = np.arange(K)
 
     for it in range(1, max_iter + 1):
-        g = gradient_parallel(x, existing, n_jobs=n_jobs)
-        gnorm = float(np.linalg.norm(g))
-
-        # Sustabdymas pagal mažą gradiento normą
-        if gnorm < tol:
-            hist.append({"iter": it, "f": f, "step": 0.0,
-                         "gnorm": gnorm, "stop": "||grad||<tol"})
+        gn = np.sqrt(np.sum(g[active] ** 2, axis=(1, 2)))
+        gnorm[active] = gn
+        iters[active] = it
+
+        conv = gn < tol
+        stop[active[conv]] = "||grad||<tol"
+        act = ~conv
+        active = active[act]
+        if active.size == 0:
             break
 
-        # Vienas gradientinio metodo žingsnis su fiksuotu žingsniu 'step'
-        x_new = x - step * g
-        f_new = objective(x_new, existing)
-
-        # Paprasta apsauga: jei F padidėjo labai ryškiai, stabdom (nenorim „iššokti“)
-        if f_new > f and f_new - f > 1e-6:
-            hist.append({"iter": it, "f": f, "step": step,
-                         "gnorm": gnorm, "stop": "F padidėjo"})
+        X_new = X[active] - step * g[active]
+        f_new, g_new = objective_and_grad_batch(X_new, existing)
+
+        # tas pats apsauginis kriterijus kaip gradient_method
+        up = (f_new > f[active]) & (f_new - f[active] > 1e-6)
+        stop[active[up]] = "F padidėjo"
+        ok = ~up
+        active = active[ok]
+        X[active] = X_new[ok]
+        f[active] = f_new[ok]
+        g[active] = g_new[ok]
+        if active.size == 0:
             break
-
-        # Patvirtiname žingsnį
-        x = x_new
-        f = f_new
-
-        # Užfiksuojame trajektorijų taškus ir istoriją
-        if it % track_every == 0:
-            for j in range(m):
-                paths[j].append(x[2 * j:2 * j + 2].copy())
-            hist.append({"iter": it, "f": f, "step": step, "gnorm": gnorm})
-
     else:
-        # pasiekta max_iter
-        hist.append({"iter": max_iter, "f": f, "step": step,
-                     "gnorm": float(np.linalg.norm(
-                         gradient_parallel(x, existing, n_jobs=n_jobs)
-                     )),
-                     "stop": "max_iter"})
+        iters[active] = max_iter
+        gnorm[active] = np.sqrt(np.sum(g[active] ** 2, axis=(1, 2)))
+
+    return X, f0, f, iters, gnorm, stop
+
+# Grąžina (x_best, f_best, stats); stats – sąrašas dict'ų kiekvienam startui
+# x0s (K, m, 2) – pradiniai išdėstymai; jei None, generuojami K atsitiktinių
+def multi_start(existing, m=None, K=8, x0s=None, max_iter=2000, tol=1e-6,
+                step=0.01, n_jobs=1, seed=None, bounds=(-10.0, 10.0)):
+    if x0s is None:
+        if m is None:
+            raise ValueError("multi_start needs either x0s or m")
+        x0s = np.random.default_rng(seed).uniform(bounds[0], bounds[1], size=(K, m, 2))
+    x0s = np.asarray(x0s, dtype=float)
+    K = len(x0s)
+
+    if n_jobs == 1 or K == 1:
+        parts = [_multi_start_batch(existing, x0s, max_iter, tol, step)]
+    else:
+        chunks = np.array_split(np.arange(K), min(n_jobs, K))
+        parts = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(_multi_start_batch)(existing, x0s[c], max_iter, tol, step)
+            for c in chunks
+        )
+    X, f0, f, iters, gnorm, stop = (np.concatenate(col) for col in zip(*parts))
 
-    return x, hist, paths
+    stats = [{"start": k, "f0": float(f0[k]), "f": float(f[k]), "iter": int(iters[k]),
+              "gnorm": float(gnorm[k]), "stop": stop[k]} for k in range(K)]
+    best = int(np.argmin(f))
+    return X[best].reshape(-1), float(f[best]), stats
+
+# Duomenų rinkinys (existing (n,2), x0 (m,2)) – tas pats generatorius kaip eksperimentuose
+def make_dataset(n, m, seed=7):
+    rng = np.random.default_rng(seed)
+    existing_xy = rng.uniform(-10.0, 10.0, size=(n, 2))
+    x0_new = rng.uniform(-10.0, 10.0, size=(m, 2))
+    return existing_xy, x0_new
+
+# =====================================================
+# Warm restart po esamų parduotuvių pakeitimų
+# -----------------------------------------------------
+# Pakeitus esamas parduotuves, optimizuojamas visas uždavinys
+# nuo ankstesnio optimumo x_prev:
+#   existing_new = update_existing(existing, added, removed)
+#   gradient_method(existing_new, x_prev, solver="lbfgs")
+# arba, jei ankstesnis paleidimas rašė checkpoint'ą, tęsiama su
+# išsaugota solver'io būsena (L-BFGS atmintimi):
+#   gradient_method(existing_new, None, solver="lbfgs",
+#                   resume=path, max_iter=ckpt_iter + k)
+# Dalinis perskaičiavimas (tik parduotuvės šalia pakeitimų)
+# neapsimoka: vietos kaina sutraukia naujas parduotuves į
+# ~[-6.5, 6.5] sritį, mažesnę už cutoff spindulį (~9.6), todėl
+# pakeitimas paliečia beveik visas.
+# =====================================================
+# removed – esamų indeksai, added – (k, 2) naujos esamos
+def update_existing(existing, added=None, removed=None):
+    removed = np.asarray(removed if removed is not None else [], dtype=int)
+    added = np.asarray(added if added is not None else np.empty((0, 2)), dtype=float).reshape(-1, 2)
+    return np.vstack((np.delete(existing, removed, axis=0), added))
 
 def run_experiment_for_dataset(n, m, max_iter, step, n_jobs, repeats=3):
     """
     Sugeneruoja duomenų rinkinį su n esamų ir m naujų parduotuvių,
     paleidžia gradientinį metodą 'repeats' kartus ir grąžina vidutinį laiką.
     """
-    rng = np.random.default_rng(7)
-
-    existing_xy = rng.uniform(-10.0, 10.0, size=(n, 2))
-    x0_new = rng.uniform(-10.0, 10.0, size=(m, 2))
+    existing_xy, x0_new = make_dataset(n, m)
 
     times = []
     for r in range(repeats):
@@ -209,70 +1124,9 @@ if __name__ == "__main__":
     max_iter = 1500
     step = 0.01
 
-    # 8 skirtingos apimties duomenų rinkiniai
-    # datasets = [
-    #     ("S1", 6, 3),
-    #     ("S2", 20, 10),
-    #     ("S3", 50, 20),
-    #     ("S4", 100, 30),
-    #     ("S5", 100, 40),
-    #     ("S6", 100, 50),
-    #     ("S7", 200, 60),
-    #     ("S8", 200, 70),
-    # ]
-
-    datasets = [
-        ("S5", 100, 40),
-    ]
-
-    JOBS = [1, 4]
-
-    print("=== Vykdymo laiko matavimai skirtingiems duomenų rinkiniams ir n_jobs ===")
-
-    results = []
-
-    # for name, n_i, m_i in datasets:
-    #     print(f"\n--- Rinkinys {name}: n={n_i}, m={m_i} ---")
-    #     for jobs in JOBS:
-    #         avg_t = run_experiment_for_dataset(
-    #             n=n_i,
-    #             m=m_i,
-    #             max_iter=max_iter,
-    #             step=step,
-    #             n_jobs=jobs,
-    #             repeats=1
-    #         )
-    #         print(f"n_jobs = {jobs:2d} -> vidutinis laikas ~ {avg_t:.3f} s")
-    #
-    #         results.append({
-    #             "dataset": name,
-    #             "n": n_i,
-    #             "m": m_i,
-    #             "n_jobs": jobs,
-    #             "avg_time": avg_t,
-    #         })
-
-    # results_df = pd.DataFrame(results)
-
-    # print("\n=== Optimalus n_jobs kiekvienam duomenų rinkiniui ===")
-    # for name, n_i, m_i in datasets:
-    #     sub = results_df[results_df["dataset"] == name]
-    #     best_row = sub.loc[sub["avg_time"].idxmin()]
-    #     best_jobs = int(best_row["n_jobs"])
-    #     best_time = float(best_row["avg_time"])
-    #     print(f"{name}: n={n_i}, m={m_i} -> geriausia n_jobs = {best_jobs}, laikas ~ {best_time:.3f} s")
-    #
-    # for name, n_i, m_i in datasets:
-    #     sub = results_df[results_df["dataset"] == name].sort_values("n_jobs")
-    #
-    #     plt.figure(figsize=(6, 4))
-    #     plt.plot(sub["n_jobs"], sub["avg_time"], marker="o")
-    #     plt.xlabel("n_jobs (gijų skaičius)")
-    #     plt.ylabel("Vidutinis vykdymo laikas, s")
-    #     plt.title(f"Rinkinys {name}: n={n_i}, m={m_i}")
-    #     plt.grid(True)
-    #     plt.xticks(JOBS)
-    #     plt.show()
+    # Rinkinių S1–S8 (DATASETS) laiko matavimai ir n_jobs/backend
+    # palyginimas – be grafikų, su CSV/JSON išvestimi:
+    #   python bench.py scaling --csv scaling.csv --json scaling.json
 
     # Pradinis taškas naujoms parduotuvėms
     x0 = x0_new.copy()
@@ -283,14 +1137,14 @@ if __name__ == "__main__":
     print("=== Gradiento tikrinimas pradiniame taške x0 ===")
     g_seq = gradient_seq(x0_flat, existing_xy)
     g_par = gradient_parallel(x0_flat, existing_xy, n_jobs=jobs)
-    g_num = numeric_grad(x0_flat, existing_xy, eps=1e-6)
+    chk_seq = check_gradient(g_seq, x0_flat, existing_xy, mode="complex")
+    chk_par = check_gradient(g_par, x0_flat, existing_xy, mode="complex")
 
     print(f"||g_seq||_2  = {np.linalg.norm(g_seq):.6e}")
     print(f"||g_par||_2  = {np.linalg.norm(g_par):.6e}")
-    print(f"||g_num||_2  = {np.linalg.norm(g_num):.6e}")
     print(f"max|g_seq - g_par|  = {np.max(np.abs(g_seq - g_par)):.6e}")
-    print(f"max|g_seq - g_num|  = {np.max(np.abs(g_seq - g_num)):.6e}")
-    print(f"max|g_par - g_num|  = {np.max(np.abs(g_par - g_num)):.6e}")
+    print(f"g_seq kryptinės išvestinės: max paklaida = {chk_seq['max_abs_err']:.6e} ({chk_seq['evals']} F skaič.)")
+    print(f"g_par kryptinės išvestinės: max paklaida = {chk_par['max_abs_err']:.6e} ({chk_par['evals']} F skaič.)")
     print("Jei šie maksimalūs skirtumai yra maži (pvz. < 1e-5), gradientas įgyvendintas teisingai.\n")
 
     x_opt, history, paths = gradient_method(